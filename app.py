@@ -1,38 +1,99 @@
 import streamlit as st
-import pandas as pd
-import joblib
-import matplotlib.pyplot as plt
-import seaborn as sns
+from charts import form_comparison_spec, season_trend_spec
+from feature_store import STORE_COLUMNS, build_feature_store, player_history
+from scoring import INTERVAL_LABEL, TARGETS, predict_player, prediction_interval, score_players
+from storage import data_version, read_matches
+from model_registry import current_version, load_models as load_model_bundle
+from instrumentation import span
+from prediction_cache import PredictionCache
 
 # 1. Page Configuration
 st.set_page_config(page_title="Pro Player Predictor", layout="wide")
 
 # 2. Load Data & Models
-@st.cache_data
-def load_data():
-    df = pd.read_csv("training_data.csv")
-    df['Date'] = pd.to_datetime(df['Date'])
-    return df
-
-@st.cache_resource
-def load_models():
-    models = {
-        'xG': joblib.load("model_xG.pkl"),
-        'xA': joblib.load("model_xA.pkl"),
-        'Passes': joblib.load("model_Passes.pkl"),
-        'Dribbles': joblib.load("model_Dribbles.pkl")
-    }
-    return models
-
-df = load_data()
-models = load_models()
+# Keyed by the data / model version on disk (cheap file stamps, checked every
+# rerun), so new data or a new bundle is picked up without a restart
+@st.cache_data(max_entries=1)
+def load_data(data_tag):
+    # Only the columns the dashboard uses, already typed (no CSV/date parsing)
+    return read_matches(columns=STORE_COLUMNS)
+
+@st.cache_resource(max_entries=1)
+def load_models(model_version):
+    # Latest model bundle (loaded lazily, per target) or the legacy model_*.pkl files.
+    # Single-player lookups go through the compiled low-latency trees.
+    bundle = None if model_version.startswith("legacy-") else model_version
+    return load_model_bundle(version=bundle, compiled=True)
+
+@st.cache_resource(max_entries=1)
+def load_feature_store(data_tag):
+    # The store remembers which data it was built from: every cache key below
+    # uses store['data_tag'], never a fresh data_version() read
+    store = build_feature_store(load_data(data_tag))
+    store['data_tag'] = data_tag
+    return store
+
+@st.cache_resource(max_entries=1)
+def load_prediction_cache(data_tag, model_version):
+    # On-disk cache shared by every session/process; entries for older
+    # data/model versions can never be hit again, so drop them up front
+    cache = PredictionCache()
+    cache.purge(data_tag, model_version)
+    return cache
+
+store = load_feature_store(data_version())
+try:
+    models = load_models(current_version())
+except ValueError as e:
+    st.error(f"❌ Refusing to load models: {e}")
+    st.stop()
+
+# --- LEAGUE-WIDE SCORES ---
+# Every eligible player scored in one vectorized pass, cached until the
+# models or the data change; leaderboard and N-way views just filter it
+@st.cache_data(max_entries=1)
+def league_scores(model_version, data_tag, _models, _store):
+    return score_players(_models, _store)
 
 # --- SIDEBAR ---
 st.sidebar.title("⚽ Player Scout")
+team_list = list(store['teams'])
+view = st.sidebar.radio("View", ["🚀 Player Analysis", "🏆 Leaderboard"], key="view")
+
+if view == "🏆 Leaderboard":
+    # --- LEADERBOARD VIEW ---
+    st.title("🏆 Projected Leaderboard")
+    scores = league_scores(models.version, store['data_tag'], models, store)
+
+    col1, col2, col3, col4 = st.columns(4)
+    metric = col1.selectbox("Rank by", TARGETS)
+    teams = col2.multiselect("Teams (empty = all)", team_list)
+    top_n = col3.slider("Show top", 5, 100, 20)
+    # Multi-season stores go well past 38 games (Streamlit needs max > min)
+    most_games = int(scores['Games'].max()) if len(scores) else 3
+    min_games = col4.slider("Min. games played", 3, max(4, most_games), 3)
+    if scores['League'].isna().all():
+        scores = scores.drop(columns='League')
+    leagues = sorted(scores['League'].dropna().unique()) if 'League' in scores.columns else []
+    if len(leagues) > 1:
+        chosen = st.multiselect("Leagues (empty = all)", leagues)
+        if chosen:
+            scores = scores[scores['League'].isin(chosen)]
+    lowest_first = st.checkbox("Lowest first")
+
+    if teams:
+        scores = scores[scores['Team'].isin(teams)]
+    scores = scores[scores['Games'] >= min_games]
+    board = scores.sort_values(by=metric, ascending=lowest_first).head(top_n).reset_index(drop=True)
+    board.index += 1
+
+    st.subheader(f"Top {len(board)} projected {metric}")
+    st.dataframe(board.round(2))
+    st.stop()
+
 st.sidebar.markdown("### 1. Primary Player")
-team_list = sorted(df['Team'].unique())
 team1 = st.sidebar.selectbox("Select Team", team_list, key="team1")
-player_list1 = sorted(df[df['Team'] == team1]['Player'].unique())
+player_list1 = store['teams'][team1]
 player1 = st.sidebar.selectbox("Select Player", player_list1, key="p1")
 
 # Comparison Toggle
@@ -43,37 +104,51 @@ player2 = None
 if compare_mode:
     st.sidebar.markdown("### 2. Comparison Player")
     team2 = st.sidebar.selectbox("Select Opponent Team", team_list, key="team2", index=1)
-    player_list2 = sorted(df[df['Team'] == team2]['Player'].unique())
+    player_list2 = store['teams'][team2]
     player2 = st.sidebar.selectbox("Select Opponent", player_list2, key="p2")
+    more_players = st.sidebar.multiselect("➕ Add More Players", store['eligible'], key="more")
+
+# Team-context models also know who player 1's team plays next
+opponent, home = None, None
+if 'team_context' in models.feature_stages:
+    st.sidebar.markdown("---")
+    picked = st.sidebar.selectbox("🆚 Next Opponent", ["Unknown"] + team_list, key="opponent")
+    venue = st.sidebar.radio("Venue", ["Unknown", "Home", "Away"], horizontal=True, key="venue")
+    opponent = None if picked == "Unknown" else picked
+    home = None if venue == "Unknown" else venue == "Home"
 
 # --- HELPER FUNCTION ---
-def get_prediction(player_name, models, df):
-    stats = df[df['Player'] == player_name].sort_values(by='Date')
-    if len(stats) < 3:
-        return None, stats
-    
-    last_3 = stats.tail(3)
-    features = pd.DataFrame({
-        'Roll_3_xG': [last_3['xG'].mean()],
-        'Roll_3_xA': [last_3['xA'].mean()],
-        'Roll_3_Passes': [last_3['Passes'].mean()],
-        'Roll_3_Dribbles': [last_3['Dribbles'].mean()],
-        'Roll_3_Minutes': [last_3['Minutes'].mean()]
-    })
-    
-    preds = {
-        'xG': models['xG'].predict(features)[0],
-        'xA': models['xA'].predict(features)[0],
-        'Passes': models['Passes'].predict(features)[0],
-        'Dribbles': models['Dribbles'].predict(features)[0]
-    }
-    return preds, stats
+def get_prediction(player_name, models, store, opponent=None, home=None):
+    with span("app.prediction", player=player_name, model_version=models.version):
+        data_tag = store['data_tag']
+        context = None if opponent is None and home is None else [opponent, home]
+        cache = load_prediction_cache(data_tag, models.version)
+        preds = cache.get_or_compute(
+            player_name, data_tag, models.version,
+            lambda: predict_player(player_name, models, store, opponent, home)[0], context,
+        )
+        return preds, player_history(store, player_name)
+
+# Chart specs are cached per (player(s), model version, data version), so a
+# rerun only re-renders in the browser; leading "_" args aren't hashed
+@st.cache_data(max_entries=512)
+def trend_chart(player_name, model_version, data_tag, _models, _store, opponent=None, home=None):
+    preds, stats = get_prediction(player_name, _models, _store, opponent, home)
+    return season_trend_spec(stats, preds['xG'], interval=prediction_interval(preds, 'xG'),
+                             interval_label=INTERVAL_LABEL)
+
+@st.cache_data(max_entries=512)
+def form_chart(player_names, data_tag, _store):
+    return form_comparison_spec({p: player_history(_store, p) for p in player_names}, last_n=10)
 
 # --- MAIN UI ---
 st.title("⚽ AI Match Predictor")
 
 # Get Data for Player 1
-p1_preds, p1_stats = get_prediction(player1, models, df)
+p1_preds, p1_stats = get_prediction(player1, models, store, opponent, home)
+cache_stats = load_prediction_cache(store['data_tag'], models.version).stats()
+st.sidebar.caption(f"🗄️ Prediction cache: {cache_stats['entries']} entries, "
+                   f"{cache_stats['hit_rate']:.0%} hit rate")
 
 if not compare_mode:
     # --- SINGLE PLAYER VIEW (ORIGINAL) ---
@@ -83,16 +158,19 @@ if not compare_mode:
     col2.metric("Predicted xA", f"{p1_preds['xA']:.2f}")
     col3.metric("Passes", f"{int(p1_preds['Passes'])}")
     col4.metric("Dribbles", f"{p1_preds['Dribbles']:.1f}")
+    # Prediction intervals, when the bundle has quantile models
+    for col, target, fmt in [(col1, 'xG', '.2f'), (col2, 'xA', '.2f'), (col3, 'Passes', '.0f'), (col4, 'Dribbles', '.1f')]:
+        interval = prediction_interval(p1_preds, target)
+        if interval is not None:
+            col.caption(f"{INTERVAL_LABEL}: {interval[0]:{fmt}} – {interval[1]:{fmt}}")
 
     st.subheader("📈 Season Trend")
-    fig, ax = plt.subplots(figsize=(10, 3))
-    sns.lineplot(data=p1_stats, x='Date', y='xG', marker='o', label='Actual xG', ax=ax)
-    ax.axhline(p1_preds['xG'], color='red', linestyle='--', label='Next Match Prediction')
-    st.pyplot(fig)
+    spec = trend_chart(player1, models.version, store['data_tag'], models, store, opponent, home)
+    st.vega_lite_chart(spec)
 
 else:
     # --- COMPARISON VIEW (NEW) ---
-    p2_preds, p2_stats = get_prediction(player2, models, df)
+    p2_preds, p2_stats = get_prediction(player2, models, store)
     
     st.subheader(f"⚔️ Head-to-Head: {player1} vs {player2}")
     
@@ -113,12 +191,14 @@ else:
         st.metric("Passes", f"{int(p2_preds['Passes'])}", delta=f"{int(p2_preds['Passes'] - p1_preds['Passes'])}")
 
     # Comparison Chart
+    compared = list(dict.fromkeys([player1, player2] + more_players))
+    if len(compared) > 2:
+        # N-way comparison straight from the cached league-wide scores
+        st.subheader(f"📋 {len(compared)}-Way Comparison")
+        scores = league_scores(models.version, store['data_tag'], models, store)
+        table = scores.set_index('Player').loc[[p for p in compared if p in set(scores['Player'])]]
+        st.dataframe(table.sort_values(by='xG', ascending=False).round(2))
+
     st.subheader("📊 Form Comparison (Last 5 Games xG)")
-    fig, ax = plt.subplots(figsize=(10, 4))
-    
-    # Plot both lines
-    sns.lineplot(data=p1_stats.tail(10), x='Date', y='xG', marker='o', label=player1, ax=ax)
-    sns.lineplot(data=p2_stats.tail(10), x='Date', y='xG', marker='o', label=player2, ax=ax)
-    
-    ax.set_ylabel("Expected Goals (xG)")
-    st.pyplot(fig)
\ No newline at end of file
+    spec = form_chart(tuple(compared), store['data_tag'], store)
+    st.vega_lite_chart(spec)
\ No newline at end of file
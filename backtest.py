@@ -0,0 +1,145 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from concurrent.futures import ProcessPoolExecutor
+from features import FEATURE_METRICS, add_rolling_features, feature_columns
+from storage import CACHE_DIR, data_version, read_matches
+from scoring import TARGETS
+
+RESULTS_FILE = "backtest_results.csv"
+
+# Default model settings, shared with train_all.py
+# (same as the old XGBRegressor(n_estimators=200, learning_rate=0.05))
+PARAMS = {'objective': 'reg:squarederror', 'tree_method': 'hist', 'learning_rate': 0.05}
+NUM_ROUNDS = 200
+
+
+def date_split(dates, test_size=0.2):
+    # Train/test mask that never splits a matchday: every row on the cutoff
+    # date and after is test, so roughly the last test_size of rows by date
+    dates = pd.to_datetime(pd.Series(dates)).to_numpy()
+    cutoff = np.sort(dates)[int(len(dates) * (1 - test_size))]
+    return dates < cutoff
+
+
+def load_feature_table(windows=(3,), refresh=False):
+    # Rolling features for every row, computed once per data version and
+    # reused by every fold (and every later backtest run on the same data)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tag = "-".join(map(str, windows))
+    path = os.path.join(CACHE_DIR, f"features_{data_version()}_w{tag}.parquet")
+    if os.path.exists(path) and not refresh:
+        return pd.read_parquet(path)
+
+    print("⚙️ Engineering Features (cached for later runs)...")
+    df = read_matches(columns=['Player', 'Date'] + FEATURE_METRICS)
+    df = add_rolling_features(df, FEATURE_METRICS, windows).dropna()
+    df = df.sort_values(by='Date', kind='mergesort').reset_index(drop=True)
+    df.to_parquet(path, index=False)
+    return df
+
+
+def matchweek_folds(dates, n_folds=10, freq='W'):
+    # Walk-forward folds: each of the last n_folds matchweeks is a test set,
+    # trained on everything before it
+    weeks = pd.to_datetime(pd.Series(dates)).dt.to_period(freq)
+    periods = sorted(weeks.unique())[-n_folds:]
+    return [(p.start_time, p.end_time) for p in periods]
+
+
+# Worker state, set once per process instead of pickling the data per fold
+_X = _Y = _dates = None
+
+
+def _init_worker(X, Y, dates):
+    global _X, _Y, _dates
+    _X, _Y, _dates = X, Y, dates
+
+
+def run_fold(fold_id, start, end, settings):
+    # settings: {target: (params, num_rounds)}
+    train = _dates < np.datetime64(start)
+    test = (_dates >= np.datetime64(start)) & (_dates <= np.datetime64(end))
+    rows = []
+    if train.sum() == 0 or test.sum() == 0:
+        return rows
+
+    for i, target in enumerate(TARGETS):
+        dtrain = xgb.QuantileDMatrix(_X[train], label=_Y[train, i])
+        params, num_rounds = settings[target]
+        booster = xgb.train({**params, 'nthread': 1}, dtrain, num_boost_round=num_rounds)
+        preds = booster.inplace_predict(_X[test])
+        rows.append({
+            'fold': fold_id,
+            'test_start': pd.Timestamp(start).date(),
+            'test_end': pd.Timestamp(end).date(),
+            'target': target,
+            'n_train': int(train.sum()),
+            'n_test': int(test.sum()),
+            'num_rounds': num_rounds,
+            'mae': float(np.abs(preds - _Y[test, i]).mean()),
+        })
+    return rows
+
+
+def backtest(n_folds=10, freq='W', windows=(3,), params=None, num_rounds=NUM_ROUNDS,
+             workers=None, out=RESULTS_FILE, refresh=False, tuned=False):
+    df = load_feature_table(windows, refresh)
+    feature_cols = feature_columns(FEATURE_METRICS, windows)
+    X = df[feature_cols].to_numpy(dtype=np.float32)
+    Y = df[TARGETS].to_numpy(dtype=np.float32)
+    dates = df['Date'].to_numpy()
+    overrides = params or {}
+    settings = {target: ({**PARAMS, **overrides}, num_rounds) for target in TARGETS}
+    if tuned:
+        # tune.py's per-target settings, as train_all.py uses them (--param still wins).
+        # Imported here because tune.py imports this module.
+        from tune import load_best_params
+        best = load_best_params(windows) or {}
+        for target in TARGETS:
+            if target in best:
+                settings[target] = ({**best[target]['params'], **overrides}, best[target]['num_boost_round'])
+        print(f"🎛️ Using tuned settings for {', '.join(t for t in TARGETS if t in best) or 'no targets'}")
+
+    folds = matchweek_folds(dates, n_folds, freq)
+    print(f"📊 Walk-forward backtest: {len(folds)} folds x {len(TARGETS)} targets on {len(df)} rows...")
+
+    workers = min(workers or os.cpu_count() or 1, len(folds))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X, Y, dates)) as pool:
+        futures = [pool.submit(run_fold, i, start, end, settings) for i, (start, end) in enumerate(folds)]
+        results = pd.DataFrame([row for f in futures for row in f.result()])
+
+    results.to_csv(out, index=False)
+    print(f"\n✅ Per-fold results saved to '{out}'")
+    if len(results):
+        summary = results.groupby('target')['mae'].agg(['mean', 'std', 'min', 'max'])
+        print(summary.loc[[t for t in TARGETS if t in summary.index]].round(3))
+    return results
+
+
+def _parse_param(text):
+    key, value = text.split('=', 1)
+    try:
+        value = float(value) if '.' in value or 'e' in value else int(value)
+    except ValueError:
+        pass
+    return key, value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the per-target models")
+    parser.add_argument("--folds", type=int, default=10, help="How many of the latest matchweeks to test on")
+    parser.add_argument("--freq", default="W", help="Fold length as a pandas period (W = one matchweek)")
+    parser.add_argument("--window", type=int, action="append", dest="windows", help="Rolling window, repeatable")
+    parser.add_argument("--param", action="append", default=[], help="XGBoost param override, e.g. max_depth=4")
+    parser.add_argument("--rounds", type=int, default=NUM_ROUNDS)
+    parser.add_argument("--tuned", action="store_true", help="Use tune.py's best settings per target")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--out", default=RESULTS_FILE)
+    parser.add_argument("--refresh", action="store_true", help="Recompute the cached features")
+    args = parser.parse_args()
+
+    backtest(args.folds, args.freq, tuple(args.windows or (3,)), dict(map(_parse_param, args.param)),
+             args.rounds, args.workers, args.out, args.refresh, args.tuned)
@@ -0,0 +1,242 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from features import FEATURE_COLS, FEATURE_METRICS, add_rolling_features
+from feature_store import build_feature_store
+from model_registry import load_models, save_bundle
+from process_data import normalize_match_stats
+from scoring import TARGETS, predict_player, score_players
+from train_all import NUM_ROUNDS, PARAMS
+
+# Timings for the hot paths, on synthetic training_data.csv-shaped tables:
+#   ingest    normalize_match_stats on an FBref-shaped fixture (no network)
+#   rolling   the old groupby/lambda rolling means vs features.add_rolling_features
+#   train     one target's booster, train_all.py settings
+#   predict   get_prediction for one player (predict_player), latency per call
+#   score     every eligible player in one batch (score_players)
+# Results go to benchmarks/<commit>.json; --compare prints the ratio vs an older run.
+RESULTS_DIR = "benchmarks"
+SIZES = (10_000, 100_000, 1_000_000)
+
+TEAMS = [
+    'Arsenal', 'Aston Villa', 'Bournemouth', 'Brentford', 'Brighton', 'Chelsea', 'Crystal Palace',
+    'Everton', 'Fulham', 'Ipswich Town', 'Leicester City', 'Liverpool', 'Manchester City',
+    'Manchester United', 'Newcastle United', 'Nottingham Forest', 'Southampton', 'Tottenham Hotspur',
+    'West Ham United', 'Wolverhampton Wanderers',
+]
+
+
+def synthetic_matches(n_rows, games_per_player=20, seed=0):
+    # Same columns as training_data.csv: ~games_per_player consecutive
+    # weekly games per player, stats roughly on the real scale
+    rng = np.random.default_rng(seed)
+    n_players = max(1, n_rows // games_per_player)
+    player = np.arange(n_rows) % n_players
+    game = np.arange(n_rows) // n_players
+    teams = np.array(TEAMS)
+    team = teams[player % len(TEAMS)]
+    opponent = teams[(player + 1 + game) % len(TEAMS)]
+    dates = pd.Timestamp('2024-08-16') + pd.to_timedelta(game * 7, unit='D')
+
+    minutes = rng.choice([90.0, 90.0, 90.0, 75.0, 60.0, 25.0, 10.0], n_rows)
+    xg = rng.gamma(0.6, 0.25, n_rows).round(1)
+    df = pd.DataFrame({
+        'Player': pd.Index(player).map(lambda i: f"Player {i:06d}"),
+        'Team': team,
+        'Match': dates.strftime('%Y-%m-%d') + ' ' + pd.Index(team) + '-' + pd.Index(opponent),
+        'Goals': rng.binomial(1, np.clip(xg, 0, 1)).astype(float),
+        'Assists': rng.binomial(1, 0.07, n_rows).astype(float),
+        'xG': xg,
+        'xA': rng.gamma(0.5, 0.2, n_rows).round(1),
+        'Passes': rng.poisson(22, n_rows).astype(float),
+        'Dribbles': rng.poisson(0.8, n_rows).astype(float),
+        'Minutes': minutes,
+        'Date': dates,
+    })
+    return df
+
+
+def fbref_fixture(df, league="ENG-Premier League", season="2425"):
+    # The raw shape read_player_match_stats returns: indexed by
+    # league/season/game/team/player, two-level stat columns
+    raw = pd.DataFrame({
+        ('Performance', 'Gls'): df['Goals'].to_numpy(),
+        ('Performance', 'Ast'): df['Assists'].to_numpy(),
+        ('Expected', 'xG'): df['xG'].to_numpy(),
+        ('Expected', 'xAG'): df['xA'].to_numpy(),
+        ('Passes', 'Cmp'): df['Passes'].to_numpy(),
+        ('Take-Ons', 'Succ'): df['Dribbles'].to_numpy(),
+        ('min', ''): df['Minutes'].to_numpy(),
+    })
+    raw.columns = pd.MultiIndex.from_tuples(raw.columns)
+    raw.index = pd.MultiIndex.from_arrays(
+        [[league] * len(df), [season] * len(df), df['Match'], df['Team'], df['Player']],
+        names=['league', 'season', 'game', 'team', 'player'],
+    )
+    return raw
+
+
+def legacy_rolling(df, metrics=FEATURE_METRICS):
+    # What train_all.py used to do: one Python lambda per player per metric
+    df = df.sort_values(by=['Player', 'Date'])
+    for m in metrics:
+        df[f'Roll_3_{m}'] = df.groupby('Player')[m].transform(lambda x: x.rolling(3, min_periods=1).mean().shift(1))
+    return df
+
+
+def _measure(fn, repeat=1, memory=True):
+    # Best wall time of `repeat` runs, plus Python-heap peak from one extra traced run
+    # (tracemalloc doesn't see XGBoost's own C++ allocations)
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return best, peak, result
+
+
+def _latencies_us(fn, args, repeat=3):
+    times = []
+    for _ in range(repeat):
+        for a in args:
+            start = time.perf_counter()
+            fn(a)
+            times.append(time.perf_counter() - start)
+    times = np.asarray(times) * 1e6
+    return float(np.percentile(times, 50)), float(np.percentile(times, 99))
+
+
+def _record(results, stage, rows, seconds, peak, **extra):
+    results.append({
+        'stage': stage,
+        'rows': rows,
+        'seconds': round(seconds, 6),
+        'rows_per_s': round(rows / seconds, 1) if seconds > 0 else None,
+        'peak_mb': None if peak is None else round(peak, 2),
+        **extra,
+    })
+    p50 = f"   p50 {extra['p50_us']:9.1f} µs  p99 {extra['p99_us']:9.1f} µs" if 'p50_us' in extra else ""
+    mem = f"  peak {peak:8.1f} MB" if peak is not None else ""
+    print(f"   {stage:<18} {rows:>10,} rows  {seconds:9.3f} s  {rows / seconds:>13,.0f} rows/s{mem}{p50}")
+
+
+def run_size(n_rows, results, legacy_max_rows=200_000, rounds=NUM_ROUNDS, samples=200, memory=True):
+    print(f"\n⏱️ {n_rows:,} rows")
+    df = synthetic_matches(n_rows)
+
+    # 1. Ingest: FBref fixture -> clean rows (its progress prints are muted)
+    raw = fbref_fixture(df)
+    with contextlib.redirect_stdout(io.StringIO()):
+        seconds, peak, _ = _measure(lambda: normalize_match_stats(raw), memory=memory)
+    _record(results, 'ingest', n_rows, seconds, peak)
+    del raw
+
+    # 2. Rolling features
+    if n_rows <= legacy_max_rows:
+        seconds, peak, _ = _measure(lambda: legacy_rolling(df), memory=memory)
+        _record(results, 'rolling_legacy', n_rows, seconds, peak)
+    seconds, peak, feats = _measure(lambda: add_rolling_features(df, FEATURE_METRICS, windows=(3,)), memory=memory)
+    _record(results, 'rolling', n_rows, seconds, peak)
+
+    # 3. Training, one target with train_all.py's settings
+    feats = feats.dropna()
+    X = feats[FEATURE_COLS].to_numpy(dtype=np.float32)
+    y = feats['xG'].to_numpy(dtype=np.float32)
+
+    def train():
+        dtrain = xgb.QuantileDMatrix(X, label=y, feature_names=FEATURE_COLS)
+        return xgb.train(PARAMS, dtrain, num_boost_round=rounds)
+
+    seconds, peak, booster = _measure(train, memory=memory)
+    _record(results, 'train', len(X), seconds, peak, rounds=rounds)
+
+    # 4. Inference through the real bundle/loading path
+    store = build_feature_store(df)
+    with tempfile.TemporaryDirectory() as root:
+        save_bundle({t: booster for t in TARGETS}, FEATURE_COLS, "synthetic", {}, root=root)
+        models = load_models(root=root, compiled=True)
+        rng = np.random.default_rng(0)
+        players = [store['eligible'][i] for i in rng.integers(0, len(store['eligible']), samples)]
+        predict_player(players[0], models, store)
+        p50, p99 = _latencies_us(lambda p: predict_player(p, models, store), players)
+        seconds, peak, _ = _measure(lambda: [predict_player(p, models, store) for p in players], memory=memory)
+        _record(results, 'predict', len(players), seconds, peak, p50_us=p50, p99_us=p99)
+
+        big = load_models(root=root)
+        seconds, peak, table = _measure(lambda: score_players(big, store), repeat=3, memory=memory)
+        _record(results, 'score', len(table), seconds, peak)
+
+
+def _commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(old_file, new):
+    # Ratio of seconds (new / old) per stage and size; > 1 means slower
+    with open(old_file) as f:
+        old = {(r['stage'], r['rows']): r for r in json.load(f)['results']}
+    print(f"\n📈 vs {old_file} (new/old time, >1.00 is slower):")
+    for r in new['results']:
+        before = old.get((r['stage'], r['rows']))
+        if before and before['seconds']:
+            print(f"   {r['stage']:<18} {r['rows']:>10,} rows  {r['seconds'] / before['seconds']:6.2f}x")
+
+
+def benchmark(sizes=SIZES, legacy_max_rows=200_000, rounds=NUM_ROUNDS, memory=True, out=None, compare_to=None):
+    results = []
+    for n_rows in sizes:
+        run_size(n_rows, results, legacy_max_rows, rounds, memory=memory)
+
+    report = {
+        'commit': _commit(),
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'versions': {'pandas': pd.__version__, 'numpy': np.__version__, 'xgboost': xgb.__version__},
+        'results': results,
+    }
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results saved to '{out}'")
+    if compare_to:
+        compare(compare_to, report)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingest, features, training and inference")
+    parser.add_argument("--size", type=int, action="append", dest="sizes", help="Rows of synthetic data, repeatable")
+    parser.add_argument("--legacy-max-rows", type=int, default=200_000,
+                        help="Skip the slow lambda rolling features above this size")
+    parser.add_argument("--rounds", type=int, default=NUM_ROUNDS, help="Boosting rounds for the training stage")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the traced peak-memory runs")
+    parser.add_argument("--out", help="Results file (default: benchmarks/<commit>.json)")
+    parser.add_argument("--compare", help="An earlier results file to compare against")
+    args = parser.parse_args()
+
+    benchmark(tuple(args.sizes or SIZES), args.legacy_max_rows, args.rounds, not args.no_memory,
+              args.out, args.compare)
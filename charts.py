@@ -0,0 +1,76 @@
+import pandas as pd
+
+# Dashboard charts as plain Vega-Lite specs (dicts) instead of matplotlib figures:
+# nothing to close, tiny to cache, and the browser does the drawing.
+
+# Matplotlib's default colours, so the charts look like they always have
+PALETTE = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f']
+
+
+def metric_series(history, metric='xG', last_n=None):
+    # Date/value records for one player's metric (ISO dates, plain floats)
+    history = history if last_n is None else history.tail(last_n)
+    return [
+        {'Date': d.strftime('%Y-%m-%d'), metric: float(v)}
+        for d, v in zip(pd.to_datetime(history['Date']), history[metric])
+    ]
+
+
+def season_trend_spec(history, prediction, metric='xG', height=220, interval=None, interval_label="Range"):
+    # Actual metric per match, plus a dashed line at the next-match prediction
+    # and, given interval=(low, high), a shaded band for its prediction interval
+    actual = [{**row, 'Series': f'Actual {metric}'} for row in metric_series(history, metric)]
+    band = []
+    if interval is not None:
+        band = [{
+            'data': {'values': [{'low': float(interval[0]), 'high': float(interval[1]), 'Label': interval_label}]},
+            'mark': {'type': 'rect', 'color': 'red', 'opacity': 0.12},
+            'encoding': {
+                'y': {'field': 'low', 'type': 'quantitative'},
+                'y2': {'field': 'high'},
+                'tooltip': [{'field': 'Label'}, {'field': 'low', 'format': '.2f'}, {'field': 'high', 'format': '.2f'}],
+            },
+        }]
+    return {
+        'height': height,
+        'layer': band + [
+            {
+                'data': {'values': actual},
+                'mark': {'type': 'line', 'point': True},
+                'encoding': {
+                    'x': {'field': 'Date', 'type': 'temporal'},
+                    'y': {'field': metric, 'type': 'quantitative'},
+                    'color': {'field': 'Series', 'type': 'nominal',
+                              'scale': {'range': [PALETTE[0]]}, 'title': None},
+                },
+            },
+            {
+                'data': {'values': [{metric: float(prediction), 'Label': 'Next Match Prediction'}]},
+                'mark': {'type': 'rule', 'color': 'red', 'strokeDash': [6, 4]},
+                'encoding': {
+                    'y': {'field': metric, 'type': 'quantitative'},
+                    'tooltip': [{'field': 'Label'}, {'field': metric, 'format': '.2f'}],
+                },
+            },
+        ],
+    }
+
+
+def form_comparison_spec(histories, metric='xG', last_n=10, height=260, title="Expected Goals (xG)"):
+    # histories: {player: match history}. One line per player over their last_n games.
+    values = [
+        {**row, 'Player': player}
+        for player, history in histories.items()
+        for row in metric_series(history, metric, last_n)
+    ]
+    return {
+        'height': height,
+        'data': {'values': values},
+        'mark': {'type': 'line', 'point': True},
+        'encoding': {
+            'x': {'field': 'Date', 'type': 'temporal'},
+            'y': {'field': metric, 'type': 'quantitative', 'title': title},
+            'color': {'field': 'Player', 'type': 'nominal', 'sort': list(histories),
+                      'scale': {'range': PALETTE}},
+        },
+    }
@@ -0,0 +1,225 @@
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+# Low-latency scoring: every tree of every target flattened into a few
+# NumPy arrays, walked for all trees at once. No DataFrame, no DMatrix,
+# no sklearn wrapper per call.
+# Vector-leaf trees (multi_strategy='multi_output_tree') keep one value per
+# output in each leaf: value is (n_nodes, width), scalar trees use column 0
+# and a tree's columns map to consecutive outputs starting at tree_output.
+
+
+class CompiledForest:
+
+    def __init__(self, left, right, feature, threshold, default_left, value,
+                 roots, tree_output, base_score, outputs, depth, feature_columns):
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.default_left = default_left
+        # Files compiled before vector leaves hold a 1-D value array
+        self.value = value.reshape(len(value), -1)
+        self.roots = roots
+        self.tree_output = tree_output
+        self.base_score = base_score
+        self.outputs = list(outputs)
+        self.depth = int(depth)
+        self.feature_columns = list(feature_columns)
+
+        # (n_trees * width, n_outputs) 0/1 matrix: sums every leaf value into its
+        # output with one matmul (unused columns of narrower trees are all zero)
+        width = self.value.shape[1]
+        scatter = np.zeros((len(roots), width, len(self.outputs)), dtype=np.float32)
+        for j in range(width):
+            fits = tree_output + j < len(self.outputs)
+            scatter[np.flatnonzero(fits), j, tree_output[fits] + j] = 1.0
+        self._scatter = scatter.reshape(-1, len(self.outputs))
+
+    def predict(self, X):
+        # Returns an (n_rows, n_outputs) array
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        n, n_features = X.shape
+        flat = X.ravel()
+        row_offset = (np.arange(n, dtype=np.int64) * n_features)[:, None]
+
+        # Walk every tree for every row together; leaves point at themselves
+        node = np.broadcast_to(self.roots, (n, len(self.roots)))
+        for _ in range(self.depth):
+            x = flat[row_offset + self.feature[node]]
+            go_left = np.where(np.isnan(x), self.default_left[node], x < self.threshold[node])
+            node = np.where(go_left, self.left[node], self.right[node])
+
+        return self.value[node].reshape(n, -1) @ self._scatter + self.base_score
+
+    def predict_matrix(self, X, targets=None):
+        preds = self.predict(X)
+        targets = self.outputs if targets is None else targets
+        return {t: preds[:, self.outputs.index(t)] for t in targets}
+
+    def save(self, path):
+        np.savez(
+            path, left=self.left, right=self.right, feature=self.feature,
+            threshold=self.threshold, default_left=self.default_left, value=self.value,
+            roots=self.roots, tree_output=self.tree_output, base_score=self.base_score,
+            meta=np.array(json.dumps({
+                'outputs': self.outputs, 'depth': self.depth,
+                'feature_columns': self.feature_columns,
+            })),
+        )
+
+
+def load_compiled(path):
+    data = np.load(path)
+    meta = json.loads(str(data['meta']))
+    return CompiledForest(
+        data['left'], data['right'], data['feature'], data['threshold'],
+        data['default_left'], data['value'], data['roots'], data['tree_output'],
+        data['base_score'], meta['outputs'], meta['depth'], meta['feature_columns'],
+    )
+
+
+def _parse_base_score(raw):
+    # "5E-1" in older models, "[1.2E-1,3.4E-1]" in newer (one per output)
+    return [float(v) for v in raw.strip('[]').split(',')]
+
+
+def _tree_depth(left, right):
+    depth, frontier = 0, [0]
+    while frontier:
+        frontier = [c for n in frontier if left[n] != -1 for c in (left[n], right[n])]
+        depth += 1 if frontier else 0
+    return depth
+
+
+def compile_models(models, outputs=None):
+    # models: {name: Booster or XGBRegressor}. A booster with several outputs
+    # (multi-target or multi-quantile, one tree per output or vector leaves)
+    # is expanded to outputs[name] = [...] output names, e.g. {'xG_q': ['xG_q10', 'xG_q90']}.
+    left, right, feature, threshold, default_left, value = [], [], [], [], [], []
+    roots, tree_output, base_score, names = [], [], [], []
+    depth, offset = 0, 0
+    feature_columns = None
+
+    for name, model in models.items():
+        booster = model.get_booster() if hasattr(model, 'get_booster') else model
+        raw = json.loads(booster.save_raw(raw_format="json"))
+        learner = raw['learner']
+        if learner['objective']['name'] not in ('reg:squarederror', 'reg:quantileerror', 'reg:absoluteerror'):
+            raise ValueError(f"Can't compile objective {learner['objective']['name']} for {name}")
+        if feature_columns is None:
+            feature_columns = learner.get('feature_names') or []
+
+        model_outputs = (outputs or {}).get(name, [name])
+        first_output = len(names)
+        names.extend(model_outputs)
+        base_score.extend(_parse_base_score(learner['learner_model_param']['base_score']))
+
+        trees = learner['gradient_booster']['model']
+        for tree, out in zip(trees['trees'], trees['tree_info']):
+            width = max(1, int(tree['tree_param']['size_leaf_vector']))
+            lc = np.asarray(tree['left_children'], dtype=np.int64)
+            rc = np.asarray(tree['right_children'], dtype=np.int64)
+            ids = np.arange(len(lc)) + offset
+            is_leaf = lc == -1
+
+            # Leaves loop back to themselves so extra steps are harmless
+            left.append(np.where(is_leaf, ids, lc + offset))
+            right.append(np.where(is_leaf, ids, rc + offset))
+            feature.append(np.where(is_leaf, 0, tree['split_indices']))
+            threshold.append(np.where(is_leaf, 0.0, tree['split_conditions']))
+            default_left.append(np.asarray(tree['default_left'], dtype=bool))
+            if width > 1:
+                # A vector leaf's right child is its row in leaf_weights (width values each)
+                leaves = np.zeros((len(lc), width))
+                leaves[is_leaf] = np.reshape(tree['leaf_weights'], (-1, width))[rc[is_leaf]]
+                value.append(leaves)
+            else:
+                value.append(np.where(is_leaf, tree['split_conditions'], 0.0)[:, None])
+
+            roots.append(offset)
+            tree_output.append(first_output + out)
+            depth = max(depth, _tree_depth(tree['left_children'], tree['right_children']))
+            offset += len(lc)
+
+    width = max(v.shape[1] for v in value)
+    value = [np.pad(v, ((0, 0), (0, width - v.shape[1]))) for v in value]
+    return CompiledForest(
+        np.concatenate(left), np.concatenate(right),
+        np.concatenate(feature).astype(np.int64),
+        np.concatenate(threshold).astype(np.float32),
+        np.concatenate(default_left),
+        np.concatenate(value).astype(np.float32),
+        np.asarray(roots, dtype=np.int64), np.asarray(tree_output, dtype=np.int64),
+        np.asarray(base_score, dtype=np.float32), names, depth, feature_columns,
+    )
+
+
+def _latencies(fn, inputs, repeat):
+    times = []
+    for _ in range(repeat):
+        for X in inputs:
+            start = time.perf_counter()
+            fn(X)
+            times.append(time.perf_counter() - start)
+    times = np.asarray(times) * 1e6
+    return np.percentile(times, 50), np.percentile(times, 99)
+
+
+def benchmark(batch_sizes=(1, 32), samples=200, repeat=3):
+    # Compare the dashboard's old per-request path with inplace_predict and the compiled forest
+    from features import FEATURE_COLS
+    from feature_store import load_feature_store
+    from model_registry import load_models
+    from scoring import TARGETS
+
+    print("🧠 Loading data and models...")
+    store = load_feature_store()
+    models = load_models()
+    forest = load_models(compiled=True).compiled
+
+    # Check the compiled trees against XGBoost itself
+    X_all = store['matrix'].astype(np.float32)
+    expected = models.predict_matrix(X_all, TARGETS)
+    actual = forest.predict_matrix(X_all, TARGETS)
+    diff = max(np.abs(actual[t] - expected[t]).max() for t in TARGETS)
+    rel = max((np.abs(actual[t] - expected[t]) / np.maximum(np.abs(expected[t]), 1.0)).max() for t in TARGETS)
+    print(f"✅ Max difference vs XGBoost on {len(X_all)} players: {diff:.2e} abs, {rel:.2e} rel")
+
+    def current(X):
+        # What get_prediction used to do: a DataFrame, then the sklearn-style predict per target
+        features = pd.DataFrame(X, columns=FEATURE_COLS)
+        for t in TARGETS:
+            model = models[t]
+            if hasattr(model, 'get_booster'):
+                model.predict(features)
+            else:
+                model.predict(xgb.DMatrix(features))
+
+    paths = {
+        'DataFrame + predict per target (current)': current,
+        'inplace_predict on NumPy': lambda X: models.predict_matrix(X, TARGETS),
+        'compiled forest': forest.predict,
+    }
+
+    rng = np.random.default_rng(0)
+    for size in batch_sizes:
+        inputs = [X_all[rng.integers(0, len(X_all), size)] for _ in range(samples)]
+        print(f"\n⏱️ Batch of {size} row(s), all {len(TARGETS)} targets:")
+        for label, fn in paths.items():
+            p50, p99 = _latencies(fn, inputs, repeat)
+            print(f"   {label:<45} p50 {p50:9.1f} µs   p99 {p99:9.1f} µs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark single-row and small-batch prediction latency")
+    parser.add_argument("--batch", type=int, action="append", dest="batch_sizes")
+    parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+    benchmark(tuple(args.batch_sizes or (1, 32)), args.samples)
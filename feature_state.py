@@ -0,0 +1,176 @@
+import json
+import numpy as np
+import pandas as pd
+from features import FEATURE_METRICS, STAT_DECIMALS, feature_columns, metric_values
+
+# Streaming version of the Roll_* features: per player, a ring buffer of the
+# last few games plus running window sums, so a new match row updates the
+# features (and the next prediction) in constant time.
+WINDOWS = (3, 10)
+
+
+class RollingFeatureState:
+
+    def __init__(self, metrics=FEATURE_METRICS, windows=WINDOWS, capacity=1024):
+        self.metrics = list(metrics)
+        self.windows = tuple(windows)
+        self.size = max(self.windows)
+        self.slots = {}
+        self.names = []
+        self.teams = []
+        self.last_dates = []
+        m = len(self.metrics)
+        self._ring = np.full((capacity, self.size, m), np.nan)
+        # _pushed drives the ring position; _games is the true games-played count
+        self._pushed = np.zeros(capacity, dtype=np.int64)
+        self._games = np.zeros(capacity, dtype=np.int64)
+        # Running sum / non-missing count of each window, per player and metric
+        self._sums = np.zeros((len(self.windows), capacity, m))
+        self._counts = np.zeros((len(self.windows), capacity, m))
+
+    def __contains__(self, player):
+        return player in self.slots
+
+    def __len__(self):
+        return len(self.slots)
+
+    def _slot(self, player):
+        slot = self.slots.get(player)
+        if slot is not None:
+            return slot
+        slot = len(self.names)
+        if slot == len(self._games):
+            self._grow()
+        self.slots[player] = slot
+        self.names.append(player)
+        self.teams.append(None)
+        self.last_dates.append(None)
+        return slot
+
+    def _grow(self):
+        extra = len(self._games)
+        self._ring = np.concatenate([self._ring, np.full((extra,) + self._ring.shape[1:], np.nan)])
+        self._pushed = np.concatenate([self._pushed, np.zeros(extra, dtype=np.int64)])
+        self._games = np.concatenate([self._games, np.zeros(extra, dtype=np.int64)])
+        self._sums = np.concatenate([self._sums, np.zeros((len(self.windows), extra, len(self.metrics)))], axis=1)
+        self._counts = np.concatenate([self._counts, np.zeros((len(self.windows), extra, len(self.metrics)))], axis=1)
+
+    def update(self, player, values, date=None, team=None):
+        # Add one played match. values: {metric: value} or a sequence in self.metrics order.
+        # Rows dated on/before the player's last match are ignored (returns False),
+        # so re-sent rows can't be double counted.
+        if date is not None and pd.isna(date):
+            # NaT would pass the "already have it" check forever
+            raise ValueError(f"Match for {player} has no valid date")
+        slot = self._slot(player)
+        if date is not None:
+            date = pd.Timestamp(date)
+            last = self.last_dates[slot]
+            if last is not None and date <= last:
+                return False
+            self.last_dates[slot] = date
+        if team is not None:
+            self.teams[slot] = team
+
+        if isinstance(values, dict):
+            values = [values.get(m, np.nan) for m in self.metrics]
+        v = np.round(np.asarray(values, dtype=np.float64), STAT_DECIMALS)
+        valid = ~np.isnan(v)
+        n = self._pushed[slot]
+
+        for k, w in enumerate(self.windows):
+            # The game falling out of this window (if it's full)
+            if n >= w:
+                old = self._ring[slot, (n - w) % self.size]
+                old_valid = ~np.isnan(old)
+                self._sums[k, slot] -= np.where(old_valid, old, 0.0)
+                self._counts[k, slot] -= old_valid
+            # Rounded like features._window_mean, so add/remove never drifts
+            self._sums[k, slot] = np.round(self._sums[k, slot] + np.where(valid, v, 0.0), STAT_DECIMALS)
+            self._counts[k, slot] += valid
+
+        self._ring[slot, n % self.size] = v
+        self._pushed[slot] = n + 1
+        self._games[slot] += 1
+        return True
+
+    def games(self, player):
+        slot = self.slots.get(player)
+        return 0 if slot is None else int(self._games[slot])
+
+    def team(self, player):
+        return self.teams[self.slots[player]]
+
+    def last_date(self, player):
+        return self.last_dates[self.slots[player]]
+
+    def eligible(self, min_games=1):
+        return [p for p in self.names if self._games[self.slots[p]] >= min_games]
+
+    def feature_matrix(self, players, windows=(3,)):
+        # Next-match Roll_* features, columns in feature_columns(metrics, windows) order
+        rows = np.array([self.slots[p] for p in players], dtype=np.intp)
+        ks = [self.windows.index(w) for w in windows]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = self._sums[ks][:, rows] / self._counts[ks][:, rows]
+        means[self._counts[ks][:, rows] == 0] = np.nan
+        # (window, player, metric) -> (player, metric, window) -> flat metric-major columns
+        return means.transpose(1, 2, 0).reshape(len(rows), -1)
+
+    def features(self, player, windows=(3,)):
+        return self.feature_matrix([player], windows)[0]
+
+    def columns(self, windows=(3,)):
+        return feature_columns(self.metrics, windows)
+
+    def apply_matches(self, df):
+        # Stream a table of new match rows (Player, Date, metrics, optional Team) in date order
+        df = df.sort_values(by='Date', kind='mergesort')
+        teams = df['Team'] if 'Team' in df.columns else [None] * len(df)
+        applied = 0
+        for player, date, team, values in zip(df['Player'], df['Date'], teams, metric_values(df, self.metrics)):
+            applied += self.update(player, values, date, team)
+        return applied
+
+    @classmethod
+    def from_frame(cls, df, metrics=FEATURE_METRICS, windows=WINDOWS):
+        # Only the last max(windows) games of each player matter for the state
+        state = cls(metrics, windows, capacity=max(16, df['Player'].nunique()))
+        df = df.sort_values(by=['Player', 'Date'], kind='mergesort')
+        recent = df.groupby('Player', sort=False, observed=True).tail(state.size)
+        games = df.groupby('Player', sort=False, observed=True).size()
+
+        state.apply_matches(recent)
+        # The ring only needed the recent games; keep the true games-played count
+        for player, slot in state.slots.items():
+            state._games[slot] = int(games[player])
+        return state
+
+    def save(self, path):
+        n = len(self.names)
+        np.savez(
+            path, ring=self._ring[:n], pushed=self._pushed[:n], games=self._games[:n],
+            sums=self._sums[:, :n], counts=self._counts[:, :n],
+            meta=np.array(json.dumps({
+                'metrics': self.metrics, 'windows': list(self.windows), 'names': self.names,
+                'teams': self.teams,
+                'last_dates': [None if d is None else d.isoformat() for d in self.last_dates],
+            })),
+        )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        meta = json.loads(str(data['meta']))
+        state = cls(meta['metrics'], meta['windows'], capacity=max(16, len(meta['names'])))
+        n = len(meta['names'])
+        state._ring[:n] = data['ring']
+        state._pushed[:n] = data['pushed']
+        state._games[:n] = data['games']
+        state._sums[:, :n] = data['sums']
+        state._counts[:, :n] = data['counts']
+        state.names = list(meta['names'])
+        state.slots = {p: i for i, p in enumerate(state.names)}
+        state.teams = list(meta['teams'])
+        state.last_dates = [None if d is None else pd.Timestamp(d) for d in meta['last_dates']]
+        return state
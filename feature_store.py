@@ -0,0 +1,79 @@
+import numpy as np
+from features import FEATURE_COLS, FEATURE_METRICS, next_match_features
+from storage import read_matches
+
+# A player needs this many games before we trust a prediction
+MIN_GAMES = 3
+
+# The only match-table columns the store needs
+# (League is missing from single-league CSVs, which is fine)
+STORE_COLUMNS = ['Player', 'Team', 'League', 'Date'] + FEATURE_METRICS
+
+
+def build_feature_store(df):
+    # Build everything the dashboard needs ONCE, so a rerun never has to
+    # scan the whole match table again.
+    #
+    # Returns a dict:
+    #   'players'  -> {player: {'history': DataFrame, 'team': latest team,
+    #                           'league': latest league or None,
+    #                           'games': int, 'row': int or None}}
+    #   'matrix'   -> (n_eligible, n_features) array of latest Roll_3_* values
+    #   'eligible' -> player names, in the same order as the matrix rows
+    #   'teams'    -> {team: sorted list of players}
+
+    # 1. Sort once (stable, so ties keep their file order)
+    df = df.sort_values(by=['Player', 'Date'], kind='mergesort')
+
+    # 2. Latest form = mean of each player's last 3 games (same engine as training)
+    latest = next_match_features(df)
+    latest = latest[latest['Games'] >= MIN_GAMES]
+
+    eligible = list(latest.index)
+    matrix = latest[FEATURE_COLS].to_numpy(dtype=np.float64)
+    rows = {p: i for i, p in enumerate(eligible)}
+
+    # 3. Match history per player (one pass over the sorted table)
+    players = {}
+    for player, history in df.groupby('Player', sort=False, observed=True):
+        players[player] = {
+            'history': history,
+            'team': history['Team'].iloc[-1],
+            'league': history['League'].iloc[-1] if 'League' in history.columns else None,
+            'games': len(history),
+            'row': rows.get(player),
+        }
+
+    # 4. Sidebar index: team -> players who have played for it
+    pairs = df[['Team', 'Player']].drop_duplicates()
+    teams = {}
+    for team, player in zip(pairs['Team'], pairs['Player']):
+        teams.setdefault(team, []).append(player)
+    teams = {team: sorted(names) for team, names in sorted(teams.items())}
+
+    return {
+        'players': players,
+        'matrix': matrix,
+        'eligible': eligible,
+        'teams': teams,
+    }
+
+
+def load_feature_store(leagues=None, seasons=None):
+    return build_feature_store(read_matches(columns=STORE_COLUMNS, leagues=leagues, seasons=seasons))
+
+
+def player_history(store, player_name):
+    entry = store['players'].get(player_name)
+    if entry is None:
+        return None
+    return entry['history']
+
+
+def player_features(store, player_name):
+    # Latest Roll_3_* vector for one player, or None if they haven't
+    # played enough games yet
+    entry = store['players'].get(player_name)
+    if entry is None or entry['row'] is None:
+        return None
+    return store['matrix'][entry['row']]
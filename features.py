@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+from instrumentation import span
+
+# The stats we turn into "form" features
+FEATURE_METRICS = ['xG', 'xA', 'Passes', 'Dribbles', 'Minutes']
+
+
+def feature_columns(metrics=FEATURE_METRICS, windows=(3,)):
+    # Same order the training scripts have always produced:
+    # every window of the first metric, then the next metric, ...
+    return [f'Roll_{w}_{m}' for m in metrics for w in windows]
+
+
+# What the dashboard models are trained on
+FEATURE_COLS = feature_columns()
+
+# FBref reports the stats to 2 decimals. The store keeps xG/xA as float32, so
+# values are rounded back to that precision before any sums: the features come
+# out exactly as they did from the float64 CSV the shipped models were trained on.
+STAT_DECIMALS = 2
+
+
+def metric_values(df, metrics=FEATURE_METRICS):
+    return np.round(df[metrics].to_numpy(dtype=np.float64), STAT_DECIMALS)
+
+
+def _player_blocks(players):
+    # players must already be grouped (sorted by Player).
+    # Returns each row's position inside its player's block, and where each block ends.
+    players = np.asarray(players)
+    n = len(players)
+    starts = np.ones(n, dtype=bool)
+    if n > 1:
+        starts[1:] = players[1:] != players[:-1]
+    block_id = np.cumsum(starts) - 1
+    first = np.flatnonzero(starts)
+    pos = np.arange(n) - first[block_id]
+    ends = np.append(first[1:], n)
+    return pos, first, ends
+
+
+def _prefix_sums(values):
+    # cs[i] = sum of rows 0..i-1 (NaN counts as missing, like rolling().mean())
+    valid = ~np.isnan(values)
+    cs = np.zeros((len(values) + 1, values.shape[1]))
+    cn = np.zeros((len(values) + 1, values.shape[1]))
+    np.cumsum(np.where(valid, values, 0.0), axis=0, out=cs[1:])
+    np.cumsum(valid, axis=0, out=cn[1:])
+    return cs, cn
+
+
+def _window_mean(cs, cn, hi, lo):
+    # Mean of rows lo..hi-1 for every (row, metric); NaN when nothing in the window.
+    # A sum of STAT_DECIMALS values has STAT_DECIMALS too: rounding drops the
+    # cumsum's float error, so every window total is exact.
+    total = np.round(cs[hi] - cs[lo], STAT_DECIMALS)
+    count = cn[hi] - cn[lo]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+
+def add_rolling_features(df, metrics=FEATURE_METRICS, windows=(3,)):
+    # Vectorized version of
+    #   df.groupby('Player')[m].transform(lambda x: x.rolling(w, min_periods=1).mean().shift(1))
+    # for every metric and window at once: one cumulative sum over the
+    # player-sorted table, then each window is just "cs[i] - cs[i - w]".
+    with span("rolling_features", rows=len(df), windows=list(windows)):
+        return _add_rolling_features(df, metrics, windows)
+
+
+def _add_rolling_features(df, metrics, windows):
+    df = df.sort_values(by=['Player', 'Date'], kind='mergesort')
+    if len(df) == 0:
+        for col in feature_columns(metrics, windows):
+            df[col] = pd.Series(dtype=np.float64)
+        return df
+
+    values = metric_values(df, metrics)
+    pos, _, _ = _player_blocks(df['Player'].to_numpy())
+    cs, cn = _prefix_sums(values)
+
+    # shift(1): the window for row i ends at i-1 and never crosses into the previous player
+    hi = np.arange(len(df))
+    rolled = {}
+    for w in windows:
+        lo = hi - np.minimum(pos, w)
+        rolled[w] = _window_mean(cs, cn, hi, lo)
+
+    for j, m in enumerate(metrics):
+        for w in windows:
+            df[f'Roll_{w}_{m}'] = rolled[w][:, j]
+    return df
+
+
+def next_match_features(df, metrics=FEATURE_METRICS, windows=(3,)):
+    # The features for each player's NEXT (not yet played) match:
+    # the mean of their last w games, including the most recent one.
+    # Returns a DataFrame indexed by Player with a 'Games' column plus the Roll_* columns.
+    df = df.sort_values(by=['Player', 'Date'], kind='mergesort')
+    players = df['Player'].to_numpy()
+    columns = feature_columns(metrics, windows)
+    if len(df) == 0:
+        return pd.DataFrame(columns=['Games'] + columns, index=pd.Index([], name='Player'))
+
+    values = metric_values(df, metrics)
+    _, first, ends = _player_blocks(players)
+    cs, cn = _prefix_sums(values)
+
+    games = ends - first
+    out = pd.DataFrame({'Games': games}, index=pd.Index(players[first], name='Player'))
+    for w in windows:
+        lo = ends - np.minimum(games, w)
+        means = _window_mean(cs, cn, ends, lo)
+        for j, m in enumerate(metrics):
+            out[f'Roll_{w}_{m}'] = means[:, j]
+    return out[['Games'] + columns]
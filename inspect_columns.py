@@ -1,9 +1,10 @@
 import soccerdata as sd
 import pandas as pd
+from process_data import LEAGUE, SEASON
 
-def inspect():
+def inspect(league=LEAGUE, season=SEASON):
     print("📂 Loading cached data...")
-    fbref = sd.FBref(leagues="ENG-Premier League", seasons="2425")
+    fbref = sd.FBref(leagues=league, seasons=season)
     
     # This will be instant because it's already downloaded
     df = fbref.read_player_match_stats(stat_type="summary")
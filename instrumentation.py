@@ -0,0 +1,161 @@
+import argparse
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Opt-in timings for the hot paths, switched on from the environment so
+# nothing has to be edited to look at a production run:
+#   SOCCER_TRACE=trace.jsonl     one JSON line per span / counter
+#   SOCCER_PROFILE=cprofile      also dump a .prof per top-level span (next to the trace)
+#   SOCCER_PROFILE=tracemalloc   also record the Python-heap peak of every span
+# With SOCCER_TRACE unset, span() and count() cost a dict lookup.
+# Spans nest per thread; work handed to a thread pool joins the submitting
+# span through run_under(current_span(), fn, ...).
+TRACE_ENV = "SOCCER_TRACE"
+PROFILE_ENV = "SOCCER_PROFILE"
+
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def enabled():
+    return bool(os.environ.get(TRACE_ENV))
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def _write(record):
+    # Append-only, one line per record, so several processes can share a file
+    line = json.dumps(record, default=str) + "\n"
+    with _lock, open(os.environ[TRACE_ENV], "a") as f:
+        f.write(line)
+
+
+def _fold_peak(frame, peak):
+    # Up the parent chain, across threads too
+    while frame is not None:
+        frame['peak'] = max(frame['peak'], peak)
+        frame = frame['up']
+
+
+def current_span():
+    # The innermost open span of this thread (None outside any span)
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def run_under(parent, fn, *args, **kwargs):
+    # Run fn in a pool thread as part of `parent` (current_span() of the
+    # submitting thread): its spans get that parent, and it isn't cProfiled
+    # as a top-level span of its own
+    if parent is None or not enabled():
+        return fn(*args, **kwargs)
+    stack = _stack()
+    stack.append(parent)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        stack.pop()
+
+
+@contextmanager
+def span(name, **fields):
+    # Time a block. Yields a dict the block can add fields to (rows=..., etc.):
+    #   with span("features", metrics=5) as s:
+    #       df = ...
+    #       s['rows'] = len(df)
+    info = {}
+    if not enabled():
+        yield info
+        return
+
+    stack = _stack()
+    up = stack[-1] if stack else None
+    parent = up['name'] if up else None
+    frame = {'name': name, 'peak': 0, 'up': up}
+    profile = os.environ.get(PROFILE_ENV, "").lower()
+
+    profiler = None
+    if profile == "cprofile" and up is None:
+        # cProfile can't nest, so only the outermost span of a thread is profiled
+        profiler = cProfile.Profile()
+        profiler.enable()
+    started_tracing = False
+    if profile == "tracemalloc":
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+        # reset_peak() is global: bank the outer spans' peak so far first
+        _fold_peak(up, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    stack.append(frame)
+
+    error = None
+    start = time.perf_counter()
+    try:
+        yield info
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        stack.pop()
+        record = {'type': 'span', 'name': name, 'parent': parent, 'ms': round(ms, 3),
+                  'ts': time.time(), 'pid': os.getpid(), **fields, **info}
+        if error:
+            record['error'] = error
+        if profile == "tracemalloc":
+            _fold_peak(frame, tracemalloc.get_traced_memory()[1])
+            record['peak_mb'] = round(frame['peak'] / 2**20, 3)
+            if started_tracing:
+                tracemalloc.stop()
+        if profiler is not None:
+            profiler.disable()
+            path = f"{os.path.splitext(os.environ[TRACE_ENV])[0]}-{name}-{os.getpid()}-{int(time.time() * 1000)}.prof"
+            profiler.dump_stats(path)
+            record['profile'] = path
+        _write(record)
+
+
+def count(name, value=1, **fields):
+    # A one-off number (rows read, cache hits, batch size...)
+    if not enabled():
+        return
+    stack = _stack()
+    _write({'type': 'counter', 'name': name, 'parent': stack[-1]['name'] if stack else None,
+            'value': value, 'ts': time.time(), 'pid': os.getpid(), **fields})
+
+
+def summarize(path):
+    # Total / mean / max ms per span name, slowest first
+    totals = {}
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get('type') != 'span':
+                continue
+            t = totals.setdefault(record['name'], {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            t['calls'] += 1
+            t['total_ms'] += record['ms']
+            t['max_ms'] = max(t['max_ms'], record['ms'])
+    return sorted(
+        ({'name': n, **t, 'mean_ms': t['total_ms'] / t['calls']} for n, t in totals.items()),
+        key=lambda t: -t['total_ms'],
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a SOCCER_TRACE file")
+    parser.add_argument("trace")
+    args = parser.parse_args()
+    print(f"{'span':<32} {'calls':>7} {'total ms':>12} {'mean ms':>10} {'max ms':>10}")
+    for t in summarize(args.trace):
+        print(f"{t['name']:<32} {t['calls']:>7} {t['total_ms']:>12.1f} {t['mean_ms']:>10.2f} {t['max_ms']:>10.2f}")
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import time
+import joblib
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from features import FEATURE_COLS
+from fast_predict import compile_models, load_compiled
+from team_context import TEAM_CONTEXT_COLS
+
+# Versioned model bundles:
+#   models/<name>/<version>/manifest.json   feature columns, data hash, metrics
+#   models/<name>/<version>/<target>.ubj    XGBoost native binary boosters
+#   models/<name>/LATEST                    which version to serve
+MODELS_DIR = "models"
+DEFAULT_BUNDLE = "dashboard"
+BUNDLE_FORMAT = 1
+COMPILED_FILE = "compiled.npz"
+
+# The compiled forest wins on single rows and small batches; past this,
+# XGBoost's own multithreaded predictor is faster
+COMPILED_MAX_ROWS = 16
+
+# Opt-in feature stages a bundle can be trained with, and the columns each
+# one appends after the base features (recorded as 'feature_stages' in the manifest)
+FEATURE_STAGES = {'team_context': TEAM_CONTEXT_COLS}
+
+# Pre-bundle artifacts written by older versions of train_all.py
+LEGACY_FILES = {
+    'xG': "model_xG.pkl",
+    'xA': "model_xA.pkl",
+    'Passes': "model_Passes.pkl",
+    'Dribbles': "model_Dribbles.pkl",
+}
+
+
+def data_fingerprint(df):
+    # Stable hash of the exact rows/columns a model was trained on
+    digest = hashlib.sha256()
+    digest.update(",".join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def save_bundle(models, feature_columns, data_hash, metrics, params=None,
+                name=DEFAULT_BUNDLE, root=MODELS_DIR, outputs=None, feature_stages=None):
+    # models: {key: XGBRegressor or Booster}; metrics/params: {target: {...}}
+    # A multi-output model lists the targets it produces: outputs={key: [target, ...]}
+    version = time.strftime("%Y%m%d-%H%M%S")
+    bundle_dir = os.path.join(root, name, version)
+    os.makedirs(bundle_dir, exist_ok=True)
+
+    targets = {}
+    for key, model in models.items():
+        booster = model.get_booster() if hasattr(model, 'get_booster') else model
+        filename = f"{key}.ubj"
+        booster.save_model(os.path.join(bundle_dir, filename))
+        produces = (outputs or {}).get(key, [key])
+        for i, target in enumerate(produces):
+            targets[target] = {
+                'file': filename,
+                'output': i if len(produces) > 1 else None,
+                'metrics': (metrics or {}).get(target, {}),
+                'params': (params or {}).get(target, {}),
+            }
+
+    # Flat-array copy of every tree for the low-latency path
+    compile_models(models, outputs).save(os.path.join(bundle_dir, COMPILED_FILE))
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'name': name,
+        'version': version,
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'feature_columns': list(feature_columns),
+        'feature_stages': list(feature_stages or []),
+        'training_data_sha256': data_hash,
+        'targets': targets,
+        'compiled': COMPILED_FILE,
+    }
+    with open(os.path.join(bundle_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Point LATEST at the new version only once everything is on disk
+    with open(os.path.join(root, name, "LATEST"), "w") as f:
+        f.write(version)
+    return version
+
+
+def load_manifest(name=DEFAULT_BUNDLE, version=None, root=MODELS_DIR):
+    if version is None:
+        latest = os.path.join(root, name, "LATEST")
+        if not os.path.exists(latest):
+            return None
+        with open(latest) as f:
+            version = f.read().strip()
+    with open(os.path.join(root, name, version, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported model bundle format {manifest.get('format')} in {name}/{version}")
+    manifest['path'] = os.path.join(root, name, version)
+    return manifest
+
+
+class LazyModels:
+    # Dict-like {target: model} that only deserializes a model the first time
+    # it's asked for, so cold starts don't pay for targets nobody requested.
+    # Several targets can share one multi-output model file:
+    #   outputs = {target: (model key, output column or None)}
+
+    def __init__(self, loaders, version, feature_columns, manifest=None, compiled_loader=None, outputs=None):
+        self._loaders = dict(loaders)
+        self._outputs = dict(outputs) if outputs else {key: (key, None) for key in self._loaders}
+        self._loaded = {}
+        self._compiled_loader = compiled_loader
+        self._compiled = None
+        self.version = version
+        self.feature_columns = list(feature_columns)
+        self.manifest = manifest
+        self.feature_stages = list((manifest or {}).get('feature_stages', []))
+
+    def model(self, key):
+        if key not in self._loaded:
+            self._loaded[key] = self._loaders[key]()
+        return self._loaded[key]
+
+    def __getitem__(self, target):
+        return self.model(self._outputs[target][0])
+
+    def __contains__(self, target):
+        return target in self._outputs
+
+    def __iter__(self):
+        return iter(self._outputs)
+
+    def __len__(self):
+        return len(self._outputs)
+
+    def keys(self):
+        return self._outputs.keys()
+
+    def _predict_model(self, key, X):
+        model = self.model(key)
+        if isinstance(model, xgb.Booster):
+            return np.asarray(model.inplace_predict(X))
+        # Legacy sklearn wrappers want the column names they were fitted with
+        return np.asarray(model.predict(pd.DataFrame(X, columns=self.feature_columns)))
+
+    def predict(self, target, X):
+        key, column = self._outputs[target]
+        preds = self._predict_model(key, X)
+        return preds if column is None else preds[:, column]
+
+    @property
+    def compiled(self):
+        if self._compiled is None and self._compiled_loader is not None:
+            self._compiled = self._compiled_loader()
+        return self._compiled
+
+    def predict_matrix(self, X, targets=None):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        targets = list(self._outputs) if targets is None else targets
+        if self._compiled_loader is not None and len(X) <= COMPILED_MAX_ROWS:
+            return self.compiled.predict_matrix(X, targets)
+
+        # One predict call per model file, however many targets it serves
+        by_model, preds = {}, {}
+        for target in targets:
+            key, column = self._outputs[target]
+            if key not in by_model:
+                by_model[key] = self._predict_model(key, X)
+            preds[target] = by_model[key] if column is None else by_model[key][:, column]
+        return preds
+
+
+def _booster_loader(path):
+    return lambda: xgb.Booster(model_file=path)
+
+
+def _legacy_version(files):
+    stamp = "|".join(f"{f}:{os.stat(f).st_mtime_ns}:{os.path.getsize(f)}" for f in files)
+    return "legacy-" + hashlib.sha256(stamp.encode()).hexdigest()[:12]
+
+
+def current_version(name=DEFAULT_BUNDLE, root=MODELS_DIR, legacy_files=LEGACY_FILES):
+    # The version load_models would serve right now, without loading anything
+    latest = os.path.join(root, name, "LATEST")
+    if os.path.exists(latest):
+        with open(latest) as f:
+            return f.read().strip()
+    return _legacy_version(legacy_files.values())
+
+
+def load_models(name=DEFAULT_BUNDLE, version=None, root=MODELS_DIR,
+                expected_features=FEATURE_COLS, legacy_files=LEGACY_FILES, compiled=False):
+    # Latest bundle if there is one, otherwise the old model_*.pkl files.
+    # Refuses models trained on a different feature schema (expected_features
+    # plus the columns of whatever FEATURE_STAGES the bundle says it used).
+    # compiled=True routes small batches through the flat-array trees (fast_predict.py).
+    manifest = load_manifest(name, version, root)
+    if manifest is None:
+        loaders = {t: (lambda f=f: joblib.load(f)) for t, f in legacy_files.items()}
+        models = LazyModels(loaders, _legacy_version(legacy_files.values()), expected_features)
+        if compiled:
+            models._compiled_loader = lambda: compile_models({t: models.model(t) for t in loaders})
+        return models
+
+    unknown = [s for s in manifest.get('feature_stages', []) if s not in FEATURE_STAGES]
+    if unknown:
+        raise ValueError(f"Model bundle {name}/{manifest['version']} needs unknown feature stages {unknown}")
+    if expected_features is not None:
+        expected = list(expected_features)
+        for stage in manifest.get('feature_stages', []):
+            expected += FEATURE_STAGES[stage]
+        if manifest['feature_columns'] != expected:
+            raise ValueError(
+                f"Model bundle {name}/{manifest['version']} was trained on features "
+                f"{manifest['feature_columns']}, expected {expected}"
+            )
+    loaders, outputs = {}, {}
+    for target, info in manifest['targets'].items():
+        key = os.path.splitext(info['file'])[0]
+        loaders.setdefault(key, _booster_loader(os.path.join(manifest['path'], info['file'])))
+        outputs[target] = (key, info.get('output'))
+    compiled_loader = None
+    if compiled and manifest.get('compiled'):
+        compiled_loader = lambda: load_compiled(os.path.join(manifest['path'], manifest['compiled']))
+    return LazyModels(loaders, manifest['version'], manifest['feature_columns'], manifest,
+                      compiled_loader, outputs)
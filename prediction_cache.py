@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from storage import CACHE_DIR
+
+# Next-match predictions, cached on disk so every dashboard session / server
+# process shares them. Keyed by (player, data version, model version, context):
+# new data or a new model bundle means new keys, so stale entries are never
+# served and just age out. Bounded LRU: past max_entries, the least recently
+# used rows are evicted.
+CACHE_FILE = os.path.join(CACHE_DIR, "predictions.sqlite")
+MAX_ENTRIES = 5000
+
+
+class PredictionCache:
+
+    def __init__(self, path=CACHE_FILE, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            " key TEXT PRIMARY KEY, player TEXT, data_version TEXT, model_version TEXT,"
+            " value TEXT, last_used REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS predictions_lru ON predictions (last_used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)")
+        self._db.execute("INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0), ('evictions', 0)")
+
+    @staticmethod
+    def key(player, data_version, model_version, context=None):
+        return json.dumps([player, data_version, model_version, context], default=str)
+
+    def get(self, player, data_version, model_version, context=None):
+        # {target: value} or None
+        key = self.key(player, data_version, model_version, context)
+        with self._lock:
+            row = self._db.execute("SELECT value FROM predictions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._db.execute("UPDATE stats SET value = value + 1 WHERE name = 'misses'")
+                return None
+            self._db.execute("BEGIN")
+            self._db.execute("UPDATE predictions SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.execute("UPDATE stats SET value = value + 1 WHERE name = 'hits'")
+            self._db.execute("COMMIT")
+        return json.loads(row[0])
+
+    def put(self, player, data_version, model_version, preds, context=None):
+        key = self.key(player, data_version, model_version, context)
+        value = json.dumps({t: float(v) for t, v in preds.items()})
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute(
+                "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?, ?)",
+                (key, player, data_version, model_version, value, time.time()),
+            )
+            # Evict the least recently used rows past the bound
+            (size,) = self._db.execute("SELECT COUNT(*) FROM predictions").fetchone()
+            if size > self.max_entries:
+                extra = size - self.max_entries
+                self._db.execute(
+                    "DELETE FROM predictions WHERE key IN "
+                    "(SELECT key FROM predictions ORDER BY last_used LIMIT ?)", (extra,)
+                )
+                self._db.execute("UPDATE stats SET value = value + ? WHERE name = 'evictions'", (extra,))
+            self._db.execute("COMMIT")
+
+    def get_or_compute(self, player, data_version, model_version, compute, context=None):
+        # compute() -> {target: value} or None (None isn't cached)
+        preds = self.get(player, data_version, model_version, context)
+        if preds is None:
+            preds = compute()
+            if preds is not None:
+                self.put(player, data_version, model_version, preds, context)
+        return preds
+
+    def purge(self, data_version, model_version):
+        # Drop every entry for other versions (they can never be hit again).
+        # Data versions are matched by prefix, so finer-grained tags built on
+        # the same data ("<version>/...", as the server uses) are kept.
+        with self._lock:
+            cur = self._db.execute(
+                "DELETE FROM predictions WHERE model_version != ?"
+                " OR substr(data_version, 1, length(?)) != ?",
+                (model_version, data_version, data_version),
+            )
+        return cur.rowcount
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._db.execute("SELECT name, value FROM stats").fetchall())
+            (entries,) = self._db.execute("SELECT COUNT(*) FROM predictions").fetchone()
+        lookups = counts['hits'] + counts['misses']
+        return {**counts, 'entries': entries, 'max_entries': self.max_entries,
+                'hit_rate': counts['hits'] / lookups if lookups else 0.0}
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM predictions")
+            self._db.execute("UPDATE stats SET value = 0")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or reset the shared prediction cache")
+    parser.add_argument("action", choices=["stats", "clear"])
+    parser.add_argument("--path", default=CACHE_FILE)
+    args = parser.parse_args()
+
+    cache = PredictionCache(args.path)
+    if args.action == "clear":
+        cache.clear()
+        print(f"🧹 Cleared '{args.path}'")
+    else:
+        s = cache.stats()
+        print(f"📦 {s['entries']}/{s['max_entries']} entries, {s['hits']} hits / {s['misses']} misses "
+              f"({s['hit_rate']:.1%} hit rate), {s['evictions']} evicted")
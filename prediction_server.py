@@ -0,0 +1,305 @@
+import argparse
+import asyncio
+import json
+import os
+import numpy as np
+import pandas as pd
+from aiohttp import web
+from feature_state import RollingFeatureState
+from feature_store import MIN_GAMES, load_feature_store
+from instrumentation import count, span
+from model_registry import load_models
+from prediction_cache import CACHE_FILE, PredictionCache
+from scoring import QUANTILES, TARGETS, model_outputs, order_intervals, quantile_name, with_team_context
+from storage import data_version
+
+# Headless JSON API over the same store/models as the dashboard:
+#   GET  /health
+#   GET  /players/{player}/prediction[?opponent=Team&home=1]   (team-context bundles)
+#   GET  /compare?player=A&player=B[&player=C...]
+#   POST /predict/bulk   {"players": [...], "teams": [...]}  (both optional)
+#   POST /matches        {"matches": [{"Player", "Date", "Team", "xG", ...}, ...]}
+# Concurrent requests are micro-batched into one predict call per model.
+# Features come from a streaming RollingFeatureState, so posting a finished
+# match updates that player's next prediction straight away.
+# Single-player predictions go through the shared on-disk PredictionCache,
+# keyed by the player's own state (games, last match) so live updates miss it.
+
+
+class MicroBatcher:
+
+    def __init__(self, models, max_batch=512, max_wait_ms=2.0, targets=TARGETS):
+        self.models = models
+        self.targets = list(targets)
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.rows = 0
+        self._queue = None
+        self._worker = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+    async def predict(self, X):
+        # X: (n, n_features). Resolves to {output: array of n predictions}
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((np.atleast_2d(np.asarray(X, dtype=np.float32)), future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self._queue.get()]
+            size = len(pending[0][0])
+
+            # Keep collecting until the batch is full or the wait budget is spent
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            X = np.vstack([rows for rows, _ in pending])
+            try:
+                # Model calls release the GIL, keep the event loop free meanwhile
+                with span("server.batch", rows=len(X), requests=len(pending)):
+                    preds = await loop.run_in_executor(None, self.models.predict_matrix, X, self.targets)
+                preds = order_intervals(preds)
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.rows += len(X)
+            start = 0
+            for rows, future in pending:
+                end = start + len(rows)
+                if not future.done():
+                    future.set_result({t: preds[t][start:end] for t in self.targets})
+                start = end
+
+
+def build_state(store):
+    # Seed the streaming state from the store's match histories
+    history = pd.concat([entry['history'] for entry in store['players'].values()], ignore_index=True)
+    return RollingFeatureState.from_frame(history)
+
+
+def _player_info(state, player_name):
+    return {'player': player_name, 'team': state.team(player_name), 'games': state.games(player_name)}
+
+
+def _check_player(state, player_name):
+    if player_name not in state:
+        raise web.HTTPNotFound(text=f"Unknown player: {player_name}")
+    if state.games(player_name) < MIN_GAMES:
+        raise web.HTTPUnprocessableEntity(text=f"{player_name} hasn't played enough games for a prediction")
+
+
+async def _json_body(request):
+    # The request's JSON object ({} without a body); anything else is a 400
+    if not request.can_read_body:
+        return {}
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        raise web.HTTPBadRequest(text="Body must be valid JSON")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text="Body must be a JSON object")
+    return body
+
+
+def _name_list(body, key):
+    # An optional list of names; a bare string would otherwise become a set of characters
+    values = body.get(key)
+    if values is not None and (not isinstance(values, list) or not all(isinstance(v, str) for v in values)):
+        raise web.HTTPBadRequest(text=f"'{key}' must be a list of names")
+    return values
+
+
+async def _predict_raw(request, names, opponents=None, homes=None):
+    # One flat {output: float} per player, straight from the batcher
+    state = request.app['state']
+    X = with_team_context(request.app['models'], request.app['store'], state.feature_matrix(names),
+                          [state.team(name) for name in names], opponents, homes)
+    preds = await request.app['batcher'].predict(X)
+    return [{t: float(values[i]) for t, values in preds.items()} for i in range(len(names))]
+
+
+async def _predict_players(request, names, opponents=None, homes=None):
+    raw = await _predict_raw(request, names, opponents, homes)
+    return [_result(request.app['state'], name, preds) for name, preds in zip(names, raw)]
+
+
+def _result(state, name, preds):
+    # Point predictions, plus {target: [low, high]} when the bundle has interval models
+    result = {**_player_info(state, name), 'predictions': {t: preds[t] for t in TARGETS}}
+    lo, hi = QUANTILES[0], QUANTILES[-1]
+    if quantile_name(TARGETS[0], lo) in preds:
+        result['intervals'] = {t: [preds[quantile_name(t, lo)], preds[quantile_name(t, hi)]] for t in TARGETS}
+    return result
+
+
+async def health(request):
+    cache = request.app['cache']
+    return web.json_response({
+        'status': 'ok',
+        'model_version': request.app['models'].version,
+        'players': len(request.app['state'].eligible(MIN_GAMES)),
+        'cache': cache.stats() if cache is not None else None,
+    })
+
+
+async def predict_one(request):
+    name = request.match_info['player']
+    _check_player(request.app['state'], name)
+    home = request.query.get('home')
+    if home is not None:
+        home = home.lower() in ('1', 'true', 'home')
+    opponent = request.query.get('opponent')
+    context = None if opponent is None and home is None else [opponent, home]
+
+    state, cache, version = request.app['state'], request.app['cache'], request.app['models'].version
+    data_tag = f"{request.app['data_tag']}/{state.games(name)}/{state.last_date(name)}"
+    preds = cache.get(name, data_tag, version, context) if cache is not None else None
+    if preds is None:
+        preds = (await _predict_raw(request, [name], [opponent], [home]))[0]
+        if cache is not None:
+            cache.put(name, data_tag, version, preds, context)
+    result = _result(state, name, preds)
+    last = state.last_date(name)
+    result['last_match'] = last.strftime('%Y-%m-%d') if last is not None else None
+    return web.json_response(result)
+
+
+async def compare(request):
+    names = request.query.getall('player', [])
+    if len(names) < 2:
+        raise web.HTTPBadRequest(text="Pass at least two ?player= names to compare")
+    for name in names:
+        _check_player(request.app['state'], name)
+
+    results = await _predict_players(request, names)
+    # Deltas vs the first player, like the dashboard's head-to-head view
+    base = results[0]['predictions']
+    for r in results[1:]:
+        r['delta'] = {t: r['predictions'][t] - base[t] for t in TARGETS}
+    return web.json_response({'players': results})
+
+
+async def predict_bulk(request):
+    body = await _json_body(request)
+    players, teams = _name_list(body, 'players'), _name_list(body, 'teams')
+    store = request.app['store']
+    wanted = None
+    if players is not None:
+        wanted = set(players)
+    if teams is not None:
+        on_teams = {p for team in teams for p in store['teams'].get(team, [])}
+        wanted = on_teams if wanted is None else wanted & on_teams
+
+    names = [p for p in request.app['state'].eligible(MIN_GAMES) if wanted is None or p in wanted]
+    results = await _predict_players(request, names) if names else []
+    return web.json_response({'model_version': request.app['models'].version, 'players': results})
+
+
+async def post_matches(request):
+    # Finished match rows from a live feed. Rows a player already has
+    # (same or older date) are skipped, so re-sending a batch is harmless.
+    body = await _json_body(request)
+    rows = body.get('matches') or []
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise web.HTTPBadRequest(text="'matches' must be a list of match rows")
+    matches = pd.DataFrame(rows)
+    missing = [c for c in ['Player', 'Date'] if c not in matches.columns]
+    if missing:
+        raise web.HTTPBadRequest(text=f"Match rows need {', '.join(missing)}")
+    state = request.app['state']
+    for metric in state.metrics:
+        if metric not in matches.columns:
+            matches[metric] = np.nan
+        # Missing stats are fine, anything else has to be a number
+        values = pd.to_numeric(matches[metric], errors='coerce')
+        if (values.isna() & matches[metric].notna()).any():
+            raise web.HTTPBadRequest(text=f"'{metric}' must be a number")
+        matches[metric] = values
+    try:
+        matches['Date'] = pd.to_datetime(matches['Date'])
+    except (ValueError, TypeError):
+        raise web.HTTPBadRequest(text="Match rows need a valid Date")
+    if matches['Date'].isna().any():
+        raise web.HTTPBadRequest(text="Match rows need a valid Date")
+
+    applied = state.apply_matches(matches)
+    count("server.matches", applied, skipped=len(matches) - applied)
+    return web.json_response({'applied': applied, 'skipped': len(matches) - applied})
+
+
+def create_app(models=None, store=None, max_batch=512, max_wait_ms=2.0, state_file=None, cache_file=CACHE_FILE):
+    # Pass models/store in to test in-process; otherwise they're loaded from disk.
+    # With state_file, the live feature state is resumed from / snapshotted to it.
+    # cache_file=None turns the shared prediction cache off.
+    app = web.Application()
+    app['data_tag'] = data_version()
+    app['cache'] = PredictionCache(cache_file) if cache_file else None
+    app['models'] = models if models is not None else load_models(compiled=True)
+    app['store'] = store if store is not None else load_feature_store()
+    if state_file and os.path.exists(state_file):
+        app['state'] = RollingFeatureState.load(state_file)
+    else:
+        app['state'] = build_state(app['store'])
+    app['batcher'] = MicroBatcher(app['models'], max_batch, max_wait_ms, model_outputs(app['models']))
+
+    async def on_startup(app):
+        await app['batcher'].start()
+
+    async def on_cleanup(app):
+        await app['batcher'].stop()
+        if state_file:
+            app['state'].save(state_file)
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.add_routes([
+        web.get('/health', health),
+        web.get('/players/{player}/prediction', predict_one),
+        web.get('/compare', compare),
+        web.post('/predict/bulk', predict_bulk),
+        web.post('/matches', post_matches),
+    ])
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve player predictions over HTTP/JSON")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-batch", type=int, default=512)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--state-file", help="Resume/snapshot the live feature state here (.npz)")
+    parser.add_argument("--cache-file", default=CACHE_FILE, help="Shared prediction cache (SQLite)")
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    print("🧠 Loading data and models...")
+    web.run_app(create_app(max_batch=args.max_batch, max_wait_ms=args.max_wait_ms, state_file=args.state_file,
+                           cache_file=None if args.no_cache else args.cache_file),
+                host=args.host, port=args.port)
@@ -1,63 +1,275 @@
 import soccerdata as sd
 import pandas as pd
+import argparse
+import json
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from storage import ALL_COLUMNS, DATA_DIR, read_matches, write_matches
+from instrumentation import current_span, run_under, span
+
+LEAGUE = "ENG-Premier League"
+SEASON = "2425"
+# Which (league, season) slices to ingest by default
+LEAGUES = [LEAGUE]
+SEASONS = [SEASON]
+TRAINING_FILE = "training_data.csv"
+# Last ingested match date per competition, so weekly refreshes only fetch new games
+WATERMARK_FILE = "ingest_watermarks.json"
+
+# We map the "Messy Name" -> "Clean Name"
+RENAME_MAP = {
+    'player_': 'Player',
+    'team_': 'Team',
+    'game_': 'Match',
+    'Performance_Gls': 'Goals',
+    'Performance_Ast': 'Assists',
+    'Expected_xG': 'xG',
+    'Expected_xAG': 'xA',        # This is xA
+    'Passes_Cmp': 'Passes',
+    'Take-Ons_Succ': 'Dribbles',
+    'min_': 'Minutes'
+}
+
+
+def normalize_match_stats(df):
+    # Turn a raw FBref player-match table into our clean training rows
 
-def create_training_set():
-    print("⏳ Loading Scraper Data (this will be fast if cached)...")
-    
-    # 1. Load Data
-    fbref = sd.FBref(leagues="ENG-Premier League", seasons="2425")
-    df = fbref.read_player_match_stats(stat_type="summary")
-    
     # 2. Fix the Columns
-    df = df.reset_index()
-    # Flatten multi-level columns (e.g., ('Expected', 'xG') -> 'Expected_xG')
-    df.columns = ['_'.join(col).strip() if isinstance(col, tuple) else col for col in df.columns.values]
-    
+    with span("flatten_columns", rows=len(df)):
+        df = df.reset_index()
+        # Flatten multi-level columns (e.g., ('Expected', 'xG') -> 'Expected_xG')
+        df.columns = ['_'.join(col).strip() if isinstance(col, tuple) else col for col in df.columns.values]
+
     print("🧹 Cleaning and Renaming Columns...")
-    
+
     # 3. Rename to simple names
-    # We map the "Messy Name" -> "Clean Name"
-    rename_map = {
-        'player_': 'Player',
-        'team_': 'Team',
-        'game_': 'Match',
-        'Performance_Gls': 'Goals',
-        'Performance_Ast': 'Assists',
-        'Expected_xG': 'xG',
-        'Expected_xAG': 'xA',        # This is xA
-        'Passes_Cmp': 'Passes',
-        'Take-Ons_Succ': 'Dribbles',
-        'min_': 'Minutes'
-    }
-    
     # Select only the columns we need
     # (We use a list comprehension to safe-guard against missing ones)
-    cols_to_keep = [c for c in rename_map.keys() if c in df.columns]
-    df = df[cols_to_keep].rename(columns=rename_map)
-    
+    cols_to_keep = [c for c in RENAME_MAP.keys() if c in df.columns]
+    df = df[cols_to_keep].rename(columns=RENAME_MAP)
+
     # 4. Extract the Date from the 'Match' column
     # The 'Match' column usually looks like: "2024-08-18 Chelsea 0-2 Manchester City"
     # We grab the first 10 characters (the date part)
     print("📅 Extracting Dates...")
-    df['Date'] = df['Match'].astype(str).str[:10]
-    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-    
+    with span("parse_dates", rows=len(df)):
+        df['Date'] = df['Match'].astype(str).str[:10]
+        df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+
     # 5. Clean Up
     # Drop rows where Date failed or Minutes is 0 (didn't play)
-    df = df.dropna(subset=['Date'])
-    df = df[df['Minutes'].astype(float) > 0]
-    
-    # Sort by Player and Date (CRITICAL for the AI to learn patterns)
-    df = df.sort_values(by=['Player', 'Date'])
-    
-    # 6. Save to CSV
-    filename = "training_data.csv"
-    df.to_csv(filename, index=False)
-    
+    with span("clean_rows") as s:
+        df = df.dropna(subset=['Date'])
+        df = df[df['Minutes'].astype(float) > 0]
+
+        # Sort by Player and Date (CRITICAL for the AI to learn patterns)
+        df = df.sort_values(by=['Player', 'Date'])
+        s['rows'] = len(df)
+    return df
+
+
+def load_watermarks(filename=WATERMARK_FILE):
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as f:
+        return json.load(f)
+
+
+def save_watermarks(watermarks, filename=WATERMARK_FILE):
+    with open(filename, "w") as f:
+        json.dump(watermarks, f, indent=2, sort_keys=True)
+
+
+def watermark_key(league, season):
+    return f"{league}|{season}"
+
+
+def advance_watermark(watermarks, league, season, df):
+    # Remember the newest match date, plus which matches on that date we already
+    # have (a matchday can be ingested half-way through)
+    if len(df) == 0:
+        return watermarks
+    last_date = df['Date'].max()
+    matches = sorted(df.loc[df['Date'] == last_date, 'Match'].astype(str).unique())
+
+    key = watermark_key(league, season)
+    previous = watermarks.get(key)
+    if previous and previous['date'] == last_date.strftime('%Y-%m-%d'):
+        matches = sorted(set(previous['matches']) | set(matches))
+    watermarks[key] = {'date': last_date.strftime('%Y-%m-%d'), 'matches': matches}
+    return watermarks
+
+
+def fixture_path(source_dir, league, season):
+    return os.path.join(source_dir, f"{league}_{season}.pkl")
+
+
+def save_fixture(league, season, source_dir):
+    # Dump the raw FBref table for one slice so workers can be run offline later
+    os.makedirs(source_dir, exist_ok=True)
+    fbref = sd.FBref(leagues=league, seasons=season)
+    fbref.read_player_match_stats(stat_type="summary").to_pickle(fixture_path(source_dir, league, season))
+
+
+def fetch_match_stats(league, season, source_dir=None):
+    # Raw player-match table for one (league, season), either from FBref
+    # or from a local fixture written by save_fixture (no network)
+    with span("fetch", league=league, season=season, source="fixture" if source_dir else "fbref") as s:
+        if source_dir is not None:
+            df = pd.read_pickle(fixture_path(source_dir, league, season))
+        else:
+            fbref = sd.FBref(leagues=league, seasons=season)
+            df = fbref.read_player_match_stats(stat_type="summary")
+        s['rows'] = len(df)
+    return df
+
+
+def ingest_slice(league, season, source_dir=None):
+    # Worker: fetch + normalize one (league, season) slice
+    print(f"⏳ Loading {league} {season} (this will be fast if cached)...")
+    with span("ingest_slice", league=league, season=season) as s:
+        df = normalize_match_stats(fetch_match_stats(league, season, source_dir))
+        df['League'] = league
+        df['Season'] = season
+        s['rows'] = len(df)
+    return df
+
+
+def run_slices(worker, jobs, workers=4, use_threads=False):
+    # Run one worker call per (league, season) job in a bounded pool.
+    # Results come back in job order.
+    if workers <= 1 or len(jobs) <= 1:
+        return [worker(*job) for job in jobs]
+    pool_class = ThreadPoolExecutor if use_threads else ProcessPoolExecutor
+    with pool_class(max_workers=min(workers, len(jobs))) as pool:
+        if use_threads:
+            # Threads report under the calling span (processes trace on their own)
+            parent = current_span()
+            futures = [pool.submit(run_under, parent, worker, *job) for job in jobs]
+        else:
+            futures = [pool.submit(worker, *job) for job in jobs]
+        return [f.result() for f in futures]
+
+
+def create_training_set(leagues=LEAGUES, seasons=SEASONS, workers=4, source_dir=None, use_threads=False):
+    # 1. Load Data (every league x season slice in parallel)
+    jobs = [(league, season, source_dir) for league in leagues for season in seasons]
+    frames = run_slices(ingest_slice, jobs, workers, use_threads)
+
+    # Merge the slices into one dataset (League/Season say which partition a row came from)
+    df = pd.concat(frames, ignore_index=True).sort_values(by=['Player', 'Date'])
+
+    # 6. Save to the columnar store (one partition per slice) + CSV for compatibility
+    filename = TRAINING_FILE
+    with span("write_training_set", rows=len(df)):
+        write_matches(df)
+        df.to_csv(filename, index=False)
+    watermarks = load_watermarks()
+    for (league, season, _), part in zip(jobs, frames):
+        advance_watermark(watermarks, league, season, part)
+    save_watermarks(watermarks)
+
     print("\n✅ SUCCESS! Master dataset saved as '" + filename + "'")
     print(df[['Date', 'Player', 'xG', 'xA', 'Passes']].head())
-    print(f"\nTotal Rows: {len(df)}")
+    print(f"\nTotal Rows: {len(df)} from {len(jobs)} league/season slices")
+
+
+def find_new_games(schedule, watermark):
+    # Played games (they have a match report) on/after the watermark date
+    # that we haven't ingested yet
+    schedule = schedule.reset_index()
+    played = schedule[schedule['game_id'].notna() & schedule['match_report'].notna()]
+    if watermark is None:
+        return played
+    since = pd.Timestamp(watermark['date'])
+    new = played[played['date'] >= since]
+    return new[~new['game'].isin(watermark['matches'])]
+
+
+def ingest_new_matches(league, season, watermark, source_dir=None):
+    # Worker: only the matches of one slice that are newer than its watermark
+    if source_dir is not None:
+        df = normalize_match_stats(fetch_match_stats(league, season, source_dir))
+        if watermark is not None:
+            df = df[(df['Date'] >= pd.Timestamp(watermark['date'])) & ~df['Match'].isin(watermark['matches'])]
+    else:
+        fbref = sd.FBref(leagues=league, seasons=season)
+        new_games = find_new_games(fbref.read_schedule(), watermark)
+        if len(new_games) == 0:
+            return None
+        print(f"📥 Downloading {len(new_games)} new {league} matches...")
+        df = fbref.read_player_match_stats(stat_type="summary", match_id=list(new_games['game_id']))
+        df = normalize_match_stats(df)
+    df['League'] = league
+    df['Season'] = season
+    return df
+
+
+def update_training_set(leagues=LEAGUES, season=SEASON, workers=4, source_dir=None, use_threads=False):
+    # Incremental refresh: fetch only matches newer than each slice's watermark
+    # and append them to the existing dataset instead of rebuilding the season
+    filename = TRAINING_FILE
+    if not os.path.exists(filename):
+        print(f"📭 No '{filename}' yet, doing a full build instead...")
+        return create_training_set(leagues, [season], workers, source_dir, use_threads)
+
+    watermarks = load_watermarks()
+    if not any(watermark_key(league, season) in watermarks for league in leagues):
+        # First incremental run on an old single-league dataset: take the watermark from the file itself
+        existing = pd.read_csv(filename, usecols=['Match', 'Date'], parse_dates=['Date'])
+        advance_watermark(watermarks, leagues[0], season, existing)
+
+    for league in leagues:
+        watermark = watermarks.get(watermark_key(league, season))
+        since = watermark['date'] if watermark else "the start of the season"
+        print(f"⏳ Checking {league} for matches since {since}...")
+
+    jobs = [(league, season, watermarks.get(watermark_key(league, season)), source_dir) for league in leagues]
+    frames = run_slices(ingest_new_matches, jobs, workers, use_threads)
+    frames = [(job, df) for job, df in zip(jobs, frames) if df is not None and len(df) > 0]
+    if not frames:
+        print("✅ Already up to date, nothing to ingest.")
+        save_watermarks(watermarks)
+        return
+
+    # Append in the existing column order (no full rewrite)
+    with open(filename) as f:
+        header = f.readline().strip().split(',')
+    new_rows = 0
+    for (league, season, _, _), df in frames:
+        df.reindex(columns=header).to_csv(filename, mode='a', header=False, index=False)
+        advance_watermark(watermarks, league, season, df)
+        new_rows += len(df)
+
+        # Only this slice's partition gets rewritten in the columnar store
+        if os.path.isdir(DATA_DIR):
+            old = read_matches(columns=ALL_COLUMNS, leagues=[league], seasons=[season])
+            write_matches(pd.concat([old, df], ignore_index=True))
+    save_watermarks(watermarks)
+
+    print(f"\n✅ Appended {new_rows} new rows to '{filename}'")
+
 
 if __name__ == "__main__":
-    create_training_set()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build training_data.csv from FBref match logs")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only fetch matches newer than the last ingest and append them")
+    parser.add_argument("--league", action="append", dest="leagues",
+                        help=f"FBref league code, repeatable (default: {LEAGUE})")
+    parser.add_argument("--season", action="append", dest="seasons",
+                        help=f"Season code like 2425, repeatable (default: {SEASON})")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel league/season workers")
+    parser.add_argument("--threads", action="store_true", help="Use threads instead of processes")
+    parser.add_argument("--source-dir", help="Read raw slices from local fixtures instead of FBref")
+    args = parser.parse_args()
+
+    leagues = args.leagues or LEAGUES
+    seasons = args.seasons or SEASONS
+    # One outer span, so SOCCER_PROFILE=cprofile profiles the whole run
+    with span("process_data", incremental=args.incremental):
+        if args.incremental:
+            # Incremental mode only tops up the most recent season
+            update_training_set(leagues, seasons[-1], args.workers, args.source_dir, args.threads)
+        else:
+            create_training_set(leagues, seasons, args.workers, args.source_dir, args.threads)
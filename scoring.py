@@ -0,0 +1,149 @@
+import argparse
+import numpy as np
+import pandas as pd
+from feature_store import load_feature_store, player_features, player_history
+from features import FEATURE_COLS
+from model_registry import load_models
+from team_context import context_matrix, load_team_table
+
+# The four things the models predict
+TARGETS = ['xG', 'xA', 'Passes', 'Dribbles']
+
+# Prediction interval: each target's 10th and 90th percentile, from one
+# multi-quantile model per target (e.g. outputs 'xG_q10', 'xG_q90')
+QUANTILES = (0.1, 0.9)
+
+
+def quantile_name(target, q):
+    return f"{target}_q{int(round(q * 100))}"
+
+
+INTERVAL_COLS = [quantile_name(t, q) for t in TARGETS for q in QUANTILES]
+INTERVAL_LABEL = f"{int(round((QUANTILES[-1] - QUANTILES[0]) * 100))}% range"
+
+
+def model_outputs(models):
+    # Point targets, plus the interval columns if the bundle has them
+    return TARGETS + [c for c in INTERVAL_COLS if c in models]
+
+
+def prediction_interval(preds, target):
+    # (low, high) for one target from a predictions dict, or None
+    lo, hi = quantile_name(target, QUANTILES[0]), quantile_name(target, QUANTILES[-1])
+    if lo not in preds or hi not in preds:
+        return None
+    return float(preds[lo]), float(preds[hi])
+
+
+def order_intervals(preds):
+    # Quantiles can cross on odd rows, and the point model (a mean, trained
+    # separately) can land outside the range. The point estimate is never
+    # touched: the range is widened to include it, so low <= point <= high
+    for target in TARGETS:
+        lo, hi = quantile_name(target, QUANTILES[0]), quantile_name(target, QUANTILES[-1])
+        if lo in preds and hi in preds:
+            preds[lo], preds[hi] = np.minimum(preds[lo], preds[hi]), np.maximum(preds[lo], preds[hi])
+            if target in preds:
+                preds[lo], preds[hi] = np.minimum(preds[lo], preds[target]), np.maximum(preds[hi], preds[target])
+    return preds
+
+
+def predict_matrix(models, X):
+    # Run every model ONCE over a whole feature matrix.
+    # Returns {target: 1-D array of predictions, one per row of X}, plus
+    # {target}_q10 / _q90 when the bundle has interval models
+    if hasattr(models, 'predict_matrix'):
+        return order_intervals(models.predict_matrix(X, model_outputs(models)))
+
+    X = np.asarray(X, dtype=np.float64)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+
+    # Wrap the block once so the models see the column names they were trained on
+    features = pd.DataFrame(X, columns=FEATURE_COLS)
+    return {target: np.asarray(models[target].predict(features)) for target in TARGETS}
+
+
+def with_team_context(models, store, X, teams, opponents=None, homes=None):
+    # Bundles trained with the team-context stage take TEAM_CONTEXT_COLS after
+    # the player's own features. The team table is loaded once per store.
+    if 'team_context' not in getattr(models, 'feature_stages', []):
+        return X
+    if 'team_table' not in store:
+        store['team_table'] = load_team_table()
+    X = np.asarray(X, dtype=np.float64).reshape(len(teams), -1)
+    return np.hstack([X, context_matrix(store['team_table'], teams, opponents, homes)])
+
+
+def predict_player(player_name, models, store, opponent=None, home=None):
+    # One player's next-match predictions (and interval, if the bundle has one)
+    # plus their match history. Returns (None, history) if they haven't played enough games.
+    # opponent/home only matter for team-context bundles (None = unknown).
+    stats = player_history(store, player_name)
+    row = player_features(store, player_name)
+    if row is None:
+        return None, stats
+
+    row = with_team_context(models, store, row, [store['players'][player_name]['team']], [opponent], [home])
+    preds = {target: values[0] for target, values in predict_matrix(models, row).items()}
+    return preds, stats
+
+
+def score_players(models, store, players=None, teams=None):
+    # Score every eligible player (or a filtered subset) in one pass.
+    # Returns a tidy table: Player, Team, League, Games, xG, xA, Passes, Dribbles
+    # (+ xG_q10, xG_q90, ... for bundles with interval models)
+    eligible = store['eligible']
+
+    # 1. Work out which rows of the feature matrix we need
+    wanted = None
+    if players is not None:
+        wanted = set(players)
+    if teams is not None:
+        on_teams = {p for team in teams for p in store['teams'].get(team, [])}
+        wanted = on_teams if wanted is None else wanted & on_teams
+
+    if wanted is None:
+        rows = np.arange(len(eligible))
+    else:
+        rows = np.array([i for i, p in enumerate(eligible) if p in wanted], dtype=np.intp)
+
+    names = [eligible[i] for i in rows]
+    table = pd.DataFrame({
+        'Player': names,
+        'Team': [store['players'][p]['team'] for p in names],
+        'League': [store['players'][p]['league'] for p in names],
+        'Games': [store['players'][p]['games'] for p in names],
+    })
+    outputs = model_outputs(models) if hasattr(models, 'predict_matrix') else TARGETS
+    if len(rows) == 0:
+        for target in outputs:
+            table[target] = pd.Series(dtype=np.float64)
+        return table
+
+    # 2. One predict call per model for the whole block (next opponent unknown)
+    X = with_team_context(models, store, store['matrix'][rows], list(table['Team']))
+    preds = predict_matrix(models, X)
+    for target in outputs:
+        table[target] = preds[target]
+    return table
+
+
+def export_predictions(filename="predictions.csv", teams=None):
+    print("🧠 Loading data and models...")
+    models = load_models()
+    store = load_feature_store()
+    table = score_players(models, store, teams=teams)
+    table = table.sort_values(by='xG', ascending=False)
+    table.to_csv(filename, index=False)
+
+    print(f"✅ Scored {len(table)} players -> '{filename}'")
+    print(table.head(10))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score every player with one predict call per model")
+    parser.add_argument("--out", default="predictions.csv")
+    parser.add_argument("--team", action="append", dest="teams", help="Only score this team (repeatable)")
+    args = parser.parse_args()
+    export_predictions(args.out, teams=args.teams)
@@ -1,12 +1,13 @@
 import soccerdata as sd
 import pandas as pd
+from process_data import LEAGUES, SEASONS
 
-def fetch_current_stats():
+def fetch_current_stats(leagues=LEAGUES, seasons=SEASONS):
     print("⏳ Starting Scraper... (This takes 10-20 seconds unlike an API)")
     
-    # 1. Initialize the FBref Scraper for the Premier League (24/25)
-    # FBref uses the code 'ENG-Premier League'
-    fbref = sd.FBref(leagues="ENG-Premier League", seasons="2425")
+    # 1. Initialize the FBref Scraper (default: the Premier League 24/25)
+    # FBref uses codes like 'ENG-Premier League'
+    fbref = sd.FBref(leagues=leagues, seasons=seasons)
     
     print("📥 Downloading Player Match Logs (The Holy Grail of Data)...")
     
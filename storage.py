@@ -0,0 +1,205 @@
+import argparse
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from instrumentation import span
+
+# Columnar match store: one Parquet file per League/Season partition, e.g.
+#   data/League=ENG-Premier League/Season=2425/part-0.parquet
+DATA_DIR = "data"
+CSV_FILE = "training_data.csv"
+CACHE_DIR = "cache"
+PARTITION_COLS = ['League', 'Season']
+
+# Rows written before multi-league ingest have no League/Season columns
+DEFAULT_LEAGUE = "ENG-Premier League"
+DEFAULT_SEASON = "2425"
+
+# Proper dtypes, so nobody has to re-parse strings/dates on every start.
+# Whole-number stats fit in int16 (a column with gaps stays float32).
+SCHEMA = {
+    'Player': 'category',
+    'Team': 'category',
+    'Match': 'string',
+    'Goals': 'int16',
+    'Assists': 'int16',
+    'xG': 'float32',
+    'xA': 'float32',
+    'Passes': 'int16',
+    'Dribbles': 'int16',
+    'Minutes': 'int16',
+    'Date': 'datetime64[ns]',
+    'League': 'category',
+    'Season': 'category',
+}
+ALL_COLUMNS = list(SCHEMA)
+STAT_COLUMNS = [c for c, dtype in SCHEMA.items() if dtype in ('int16', 'float32')]
+
+# Free text that read_matches leaves out unless it's asked for by name
+TEXT_COLUMNS = ['Match']
+DEFAULT_COLUMNS = [c for c in ALL_COLUMNS if c not in TEXT_COLUMNS]
+
+# What read_csv can parse straight into (int16 can't hold a missing value, so
+# whole-number stats come in as float32 and are narrowed by apply_schema)
+CSV_DTYPES = {
+    c: ('float32' if dtype == 'int16' else dtype)
+    for c, dtype in SCHEMA.items() if not dtype.startswith('datetime')
+}
+
+PARTITIONING = ds.partitioning(
+    pa.schema([('League', pa.string()), ('Season', pa.string())]), flavor="hive"
+)
+
+
+def apply_schema(df):
+    for col, dtype in SCHEMA.items():
+        if col not in df.columns:
+            continue
+        if dtype == 'category':
+            # Sorted categories keep sort_values/groupby in name order
+            values = df[col].astype('category')
+            values = values.cat.remove_unused_categories()
+            df[col] = values.cat.set_categories(sorted(values.cat.categories))
+        elif dtype.startswith('datetime'):
+            df[col] = pd.to_datetime(df[col])
+        elif dtype == 'int16':
+            values = df[col].astype('float32')
+            whole = values.notna().all() and (values % 1 == 0).all() and values.abs().max() < 2**15
+            df[col] = values.astype('int16') if whole else values
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def _with_partition_cols(df):
+    df = df.copy()
+    if 'League' not in df.columns:
+        df['League'] = DEFAULT_LEAGUE
+    if 'Season' not in df.columns:
+        df['Season'] = DEFAULT_SEASON
+    for col in PARTITION_COLS:
+        df[col] = df[col].astype(str)
+    return df
+
+
+def write_matches(df, root=DATA_DIR):
+    # Write (or replace) the League/Season partitions present in df.
+    # Partitions not in df are left untouched.
+    df = apply_schema(_with_partition_cols(df))
+    # The partition keys go into the directory names as plain strings
+    for col in PARTITION_COLS:
+        df[col] = df[col].astype(str)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    ds.write_dataset(
+        table, root, format="parquet", partitioning=PARTITIONING,
+        basename_template="part-{i}.parquet", existing_data_behavior="delete_matching",
+    )
+
+
+def _filter(leagues, seasons):
+    expr = None
+    if leagues is not None:
+        expr = ds.field('League').isin(list(leagues))
+    if seasons is not None:
+        season_expr = ds.field('Season').isin([str(s) for s in seasons])
+        expr = season_expr if expr is None else expr & season_expr
+    return expr
+
+
+def read_matches(columns=None, leagues=None, seasons=None, root=DATA_DIR, csv_file=CSV_FILE, mmap=False):
+    # Load match rows with compact dtypes (SCHEMA), reading only the requested columns
+    # (and only the requested League/Season partitions). columns=None means every
+    # column except the free-text Match; ask for it by name (or ALL_COLUMNS) if needed.
+    # mmap=True serves the stat columns from a memory-mapped float32 block (see stats_block).
+    # Falls back to the CSV when the columnar store hasn't been built yet.
+    columns = list(DEFAULT_COLUMNS if columns is None else columns)
+    with span("read_matches", source="parquet" if os.path.isdir(root) else "csv", mmap=mmap) as s:
+        if mmap:
+            stats = [c for c in columns if c in STAT_COLUMNS]
+            df = _read_matches([c for c in columns if c not in stats], leagues, seasons, root, csv_file)
+            block = stats_block(stats, leagues, seasons, root, csv_file)
+            # Columns of a 2-D memmap stay views until something copies them
+            mapped = pd.DataFrame(block, columns=stats, copy=False)
+            for c in df.columns:
+                mapped[c] = df[c].array
+            df = mapped[[c for c in columns if c in mapped.columns]]
+        else:
+            df = _read_matches(columns, leagues, seasons, root, csv_file)
+        s['rows'] = len(df)
+    return df
+
+
+def stats_block(stats=STAT_COLUMNS, leagues=None, seasons=None, root=DATA_DIR, csv_file=CSV_FILE):
+    # The stat columns as one (rows, stats) float32 matrix, saved once per data
+    # version as .npy and memory-mapped read-only, so processes reading the same
+    # data share the OS page cache instead of each holding a copy
+    key = hashlib.sha256(repr((data_version(root, csv_file), list(stats), leagues, seasons)).encode())
+    path = os.path.join(CACHE_DIR, f"stats_{key.hexdigest()[:16]}.npy")
+    if not os.path.exists(path):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        block = _read_matches(list(stats), leagues, seasons, root, csv_file).to_numpy(dtype=np.float32)
+        np.save(path + ".tmp.npy", block)
+        os.replace(path + ".tmp.npy", path)
+    return np.load(path, mmap_mode='r')
+
+
+def _read_matches(columns, leagues, seasons, root, csv_file):
+    if os.path.isdir(root):
+        dataset = ds.dataset(root, format="parquet", partitioning=PARTITIONING)
+        columns = [c for c in columns if c in dataset.schema.names]
+        table = dataset.to_table(columns=columns, filter=_filter(leagues, seasons))
+        return apply_schema(table.to_pandas())
+
+    header = pd.read_csv(csv_file, nrows=0).columns
+    by_partition = leagues is not None or seasons is not None
+    usecols = [c for c in columns if c in header]
+    if by_partition:
+        usecols += [c for c in PARTITION_COLS if c in header and c not in usecols]
+    dtypes = {c: CSV_DTYPES[c] for c in usecols if c in CSV_DTYPES}
+    df = pd.read_csv(csv_file, usecols=usecols, dtype={**dtypes, 'League': str, 'Season': str})
+
+    if by_partition:
+        df = _with_partition_cols(df)
+        if leagues is not None:
+            df = df[df['League'].isin(list(leagues))]
+        if seasons is not None:
+            df = df[df['Season'].isin([str(s) for s in seasons])]
+        df = df[[c for c in columns if c in df.columns]]
+    return apply_schema(df)
+
+
+def data_version(root=DATA_DIR, csv_file=CSV_FILE):
+    # Cheap fingerprint of whatever read_matches would load (file names, sizes,
+    # mtimes), so caches can tell when the data changed without reading it
+    if os.path.isdir(root):
+        files = sorted(os.path.join(d, f) for d, _, names in os.walk(root) for f in names)
+    else:
+        files = [csv_file]
+    stamp = "|".join(f"{f}:{os.stat(f).st_mtime_ns}:{os.path.getsize(f)}" for f in files if os.path.exists(f))
+    return hashlib.sha256(stamp.encode()).hexdigest()[:16]
+
+
+def export_csv(filename=CSV_FILE, root=DATA_DIR):
+    # Compatibility export: the whole store as one flat CSV
+    df = read_matches(columns=ALL_COLUMNS, root=root, csv_file=filename)
+    df.sort_values(by=['Player', 'Date']).to_csv(filename, index=False)
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert between training_data.csv and the Parquet store")
+    parser.add_argument("action", choices=["import-csv", "export-csv"])
+    parser.add_argument("--csv", default=CSV_FILE)
+    parser.add_argument("--root", default=DATA_DIR)
+    args = parser.parse_args()
+
+    if args.action == "import-csv":
+        df = pd.read_csv(args.csv)
+        write_matches(df, args.root)
+        print(f"✅ Wrote {len(df)} rows to '{args.root}/'")
+    else:
+        df = export_csv(args.csv, args.root)
+        print(f"✅ Exported {len(df)} rows to '{args.csv}'")
@@ -0,0 +1,193 @@
+import argparse
+import difflib
+import os
+import re
+import numpy as np
+import pandas as pd
+from instrumentation import span
+from storage import CACHE_DIR, data_version, read_matches
+
+# Team-context features: who the player's team is playing, home or away, and
+# how both sides have been doing lately (rolling xG for / against per team).
+#
+#   1. parse_matches: "2024-08-24 Crystal Palace-West Ham" -> date, home team, away team
+#   2. team_table: one row per team per match with its rolling xG for/against,
+#      INCLUDING that match (so "as of" a later date it's the form going in)
+#   3. add_team_context: merge_asof of that table onto player rows, once for the
+#      player's team and once for the opponent, strictly before the match date
+TEAM_WINDOWS = (5,)
+TEAM_STATS = ['xG_for', 'xG_against']
+
+
+def team_context_columns(windows=TEAM_WINDOWS):
+    team = [f'Team_Roll_{w}_{s}' for s in TEAM_STATS for w in windows]
+    opp = [f'Opp_Roll_{w}_{s}' for s in TEAM_STATS for w in windows]
+    return ['Home'] + team + opp
+
+
+# What a team-context bundle adds after FEATURE_COLS
+TEAM_CONTEXT_COLS = team_context_columns()
+
+
+def _norm(name):
+    return re.sub(r"[^a-z0-9 ]", "", str(name).lower())
+
+
+def _similarity(short, full):
+    # FBref's short names are abbreviations of the full ones ("Manchester Utd",
+    # "Nott'ham Forest", "Wolves"): shared leading word + character overlap
+    a, b = _norm(short), _norm(full)
+    same_start = a.split()[:1] == b.split()[:1] or b.startswith(a[:4])
+    return difflib.SequenceMatcher(None, a, b).ratio() + same_start
+
+
+def _best_split(text, teams):
+    # Try every "-" as the home/away separator and both ways of assigning the
+    # two known teams; the most name-like combination wins
+    best, best_score = None, -1.0
+    for i in [m.start() for m in re.finditer("-", text)]:
+        home, away = text[:i].strip(), text[i + 1:].strip()
+        if not home or not away:
+            continue
+        for t_home, t_away in ((teams[0], teams[1]), (teams[1], teams[0])):
+            score = _similarity(home, t_home) + _similarity(away, t_away)
+            if score > best_score:
+                best, best_score = (home, away, t_home, t_away), score
+    return best
+
+
+def parse_matches(df):
+    # One row per match: Match, Date, Home, Away (full team names where known).
+    # Uses the teams that actually have player rows in each match to decode the
+    # short names, then reuses what it learned for matches with only one side.
+    pairs = df[['Match', 'Team']].astype(str).drop_duplicates()
+    teams_by_match = pairs.groupby('Match', sort=False)['Team'].agg(sorted)
+
+    learned, parsed = {}, {}
+    for match, teams in teams_by_match.items():
+        text = match[11:]
+        if len(teams) == 2:
+            split = _best_split(text, teams)
+            if split is not None:
+                home, away, t_home, t_away = split
+                learned.setdefault(home, {}).setdefault(t_home, 0)
+                learned[home][t_home] += 1
+                learned.setdefault(away, {}).setdefault(t_away, 0)
+                learned[away][t_away] += 1
+                parsed[match] = (t_home, t_away)
+
+    short_to_full = {short: max(votes, key=votes.get) for short, votes in learned.items()}
+    for match, teams in teams_by_match.items():
+        if match in parsed:
+            continue
+        # One known side: find the split whose halves map to known names
+        text = match[11:]
+        for i in [m.start() for m in re.finditer("-", text)]:
+            home, away = text[:i].strip(), text[i + 1:].strip()
+            t_home, t_away = short_to_full.get(home, home), short_to_full.get(away, away)
+            if teams[0] in (t_home, t_away):
+                parsed[match] = (t_home, t_away)
+                break
+
+    out = pd.DataFrame(
+        [(m, home, away) for m, (home, away) in parsed.items()], columns=['Match', 'Home', 'Away']
+    )
+    out['Date'] = pd.to_datetime(out['Match'].str[:10], errors='coerce')
+    return out
+
+
+def team_table(df, windows=TEAM_WINDOWS):
+    # One row per (Team, Match): Date, Opponent, Home (1/0), the team's total
+    # xG for and against in that match, and rolling means of both
+    matches = parse_matches(df)
+    home = matches.rename(columns={'Home': 'Team', 'Away': 'Opponent'}).assign(Home=1.0)
+    away = matches.rename(columns={'Away': 'Team', 'Home': 'Opponent'}).assign(Home=0.0)
+    table = pd.concat([home, away], ignore_index=True)
+
+    xg = df.assign(Match=df['Match'].astype(str), Team=df['Team'].astype(str))
+    xg = xg.groupby(['Match', 'Team'], sort=False)['xG'].sum().astype(np.float64).reset_index(name='xG_for')
+    table = table.merge(xg, on=['Match', 'Team'], how='left')
+    table = table.merge(xg.rename(columns={'Team': 'Opponent', 'xG_for': 'xG_against'}),
+                        on=['Match', 'Opponent'], how='left')
+
+    table = table.dropna(subset=['Date']).sort_values(by=['Team', 'Date'], kind='mergesort')
+    grouped = table.groupby('Team', sort=False)[TEAM_STATS]
+    for w in windows:
+        rolled = grouped.rolling(w, min_periods=1).mean().reset_index(level=0, drop=True)
+        for s in TEAM_STATS:
+            table[f'Roll_{w}_{s}'] = rolled[s]
+    return table.reset_index(drop=True)
+
+
+def load_team_table(windows=TEAM_WINDOWS, refresh=False):
+    # team_table for the whole store, cached per data version
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tag = "-".join(map(str, windows))
+    path = os.path.join(CACHE_DIR, f"team_context_{data_version()}_w{tag}.parquet")
+    if os.path.exists(path) and not refresh:
+        return pd.read_parquet(path)
+    table = team_table(read_matches(columns=['Team', 'Match', 'Date', 'xG']), windows)
+    table.to_parquet(path, index=False)
+    return table
+
+
+def _form(table, windows, prefix, key):
+    cols = [f'Roll_{w}_{s}' for s in TEAM_STATS for w in windows]
+    form = table[['Team', 'Date'] + cols].rename(columns={'Team': key, **{c: prefix + c for c in cols}})
+    form['_date'] = form['Date'].astype('datetime64[ns]')
+    return form.drop(columns='Date').sort_values(by='_date', kind='mergesort')
+
+
+def add_team_context(df, table=None, windows=TEAM_WINDOWS):
+    # Adds TEAM_CONTEXT_COLS to player rows (needs Team, Match, Date).
+    # Each side's form is its rolling xG for/against up to, not including, the match.
+    with span("team_context", rows=len(df)):
+        if table is None:
+            table = team_table(df, windows)
+        out = df.copy()
+        out['_row'] = np.arange(len(out))
+        out['_team'] = out['Team'].astype(str)
+        out['_match'] = out['Match'].astype(str)
+        out['_date'] = pd.to_datetime(out['Date']).astype('datetime64[ns]')
+
+        # Opponent + home/away for the player's team in that match (exact key join)
+        sides = table[['Match', 'Team', 'Opponent', 'Home']].rename(columns={'Match': '_match', 'Team': '_team'})
+        out = out.merge(sides, on=['_match', '_team'], how='left').rename(columns={'Opponent': '_opponent'})
+        out['_opponent'] = out['_opponent'].fillna('')
+
+        # Form going into the match: latest team row strictly before the date
+        out = out.sort_values(by='_date', kind='mergesort')
+        out = pd.merge_asof(out, _form(table, windows, 'Team_', '_team'),
+                            on='_date', by='_team', allow_exact_matches=False)
+        out = pd.merge_asof(out, _form(table, windows, 'Opp_', '_opponent'),
+                            on='_date', by='_opponent', allow_exact_matches=False)
+
+        out = out.sort_values(by='_row').drop(columns=['_row', '_team', '_match', '_date', '_opponent'])
+        out.index = df.index
+        return out
+
+
+def context_matrix(table, teams, opponents=None, homes=None, windows=TEAM_WINDOWS):
+    # TEAM_CONTEXT_COLS for upcoming matches: each team's (and opponent's) latest
+    # form. Unknown opponent / venue -> NaN, which the models treat as missing.
+    n = len(teams)
+    cols = [f'Roll_{w}_{s}' for s in TEAM_STATS for w in windows]
+    latest = table.sort_values(by='Date', kind='mergesort').groupby('Team').last()[cols]
+    own = latest.reindex([str(t) for t in teams]).to_numpy(dtype=np.float64)
+    if opponents is None:
+        opp = np.full((n, len(cols)), np.nan)
+    else:
+        opp = latest.reindex([str(o) if o is not None else '' for o in opponents]).to_numpy(dtype=np.float64)
+    home = np.full((n, 1), np.nan)
+    if homes is not None:
+        home[:, 0] = [np.nan if h is None else float(h) for h in homes]
+    return np.hstack([home, own, opp])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build (or rebuild) the cached team-context table")
+    parser.add_argument("--refresh", action="store_true")
+    args = parser.parse_args()
+    table = load_team_table(refresh=args.refresh)
+    print(f"✅ {len(table)} team-match rows for {table['Team'].nunique()} teams")
+    print(table.tail())
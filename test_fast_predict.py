@@ -0,0 +1,31 @@
+import numpy as np
+import xgboost as xgb
+from fast_predict import compile_models, load_compiled
+
+# The compiled forest has to reproduce XGBoost itself, for scalar-leaf
+# boosters and vector-leaf (multi_output_tree) ones in the same forest.
+
+
+def _data(n=2_000, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 5)).astype(np.float32)
+    X[::7, 1] = np.nan
+    y = X[:, 0] + np.abs(X[:, 2]) * rng.normal(size=n)
+    return X, y.astype(np.float32)
+
+
+def test_matches_xgboost_with_vector_leaves(tmp_path):
+    X, y = _data()
+    dtrain = xgb.DMatrix(X, label=y)
+    point = xgb.train({'objective': 'reg:squarederror', 'max_depth': 6}, dtrain, num_boost_round=40)
+    quantiles = xgb.train({'objective': 'reg:quantileerror', 'quantile_alpha': [0.1, 0.5, 0.9],
+                           'tree_method': 'hist', 'multi_strategy': 'multi_output_tree', 'max_depth': 4},
+                          dtrain, num_boost_round=20)
+    forest = compile_models({'y': point, 'y_q': quantiles}, outputs={'y_q': ['q10', 'q50', 'q90']})
+    assert forest.outputs == ['y', 'q10', 'q50', 'q90']
+
+    expected = np.column_stack([point.inplace_predict(X), quantiles.inplace_predict(X)])
+    np.testing.assert_allclose(forest.predict(X), expected, atol=1e-4)
+
+    forest.save(tmp_path / "compiled.npz")
+    np.testing.assert_allclose(load_compiled(tmp_path / "compiled.npz").predict(X[:3]), expected[:3], atol=1e-4)
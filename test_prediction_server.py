@@ -0,0 +1,147 @@
+import asyncio
+import numpy as np
+import pytest
+import xgboost as xgb
+from aiohttp.test_utils import TestClient, TestServer
+from benchmarks import synthetic_matches
+from features import FEATURE_COLS, FEATURE_METRICS, add_rolling_features
+from feature_store import build_feature_store
+from model_registry import load_models, save_bundle
+from prediction_server import create_app
+from scoring import QUANTILES, TARGETS, quantile_name
+from train_all import QUANTILE_PARAMS
+
+# The JSON API run in-process (create_app(models, store)) on synthetic matches
+# and a small throwaway model bundle, so nothing on disk is needed.
+
+
+@pytest.fixture(scope="module")
+def data(tmp_path_factory):
+    df = synthetic_matches(2_000, games_per_player=10)
+    feats = add_rolling_features(df, FEATURE_METRICS, windows=(3,)).dropna()
+    X = feats[FEATURE_COLS].to_numpy(dtype=np.float32)
+    boosters, outputs = {}, {}
+    for t in TARGETS:
+        dtrain = xgb.DMatrix(X, label=feats[t].to_numpy(dtype=np.float32), feature_names=FEATURE_COLS)
+        boosters[t] = xgb.train({'objective': 'reg:squarederror', 'max_depth': 3}, dtrain, num_boost_round=10)
+        boosters[f"{t}_q"] = xgb.train(QUANTILE_PARAMS, dtrain, num_boost_round=5)
+        outputs[f"{t}_q"] = [quantile_name(t, q) for q in QUANTILES]
+    root = str(tmp_path_factory.mktemp("models"))
+    save_bundle(boosters, FEATURE_COLS, "synthetic", {}, root=root, outputs=outputs)
+    return df, load_models(root=root, compiled=True), build_feature_store(df)
+
+
+def run(data, check, **kwargs):
+    # Start the app on a test server, hand check() a client, shut it down again
+    df, models, store = data
+
+    async def main():
+        app = create_app(models, store, cache_file=None, **kwargs)
+        async with TestClient(TestServer(app)) as client:
+            await check(app, client, store)
+
+    asyncio.run(main())
+
+
+def test_single_player(data):
+    async def check(app, client, store):
+        player = store['eligible'][0]
+        r = await client.get(f"/players/{player}/prediction")
+        assert r.status == 200
+        body = await r.json()
+        assert body['player'] == player
+        assert set(body['predictions']) == set(TARGETS)
+        # The point models' output is served as is, the range widened around it if needed
+        point = app['models'].predict_matrix(app['state'].feature_matrix([player]), TARGETS)
+        for t in TARGETS:
+            assert body['predictions'][t] == pytest.approx(float(point[t][0]))
+            low, high = body['intervals'][t]
+            assert low <= body['predictions'][t] <= high
+        assert (await client.get("/players/Nobody/prediction")).status == 404
+
+    run(data, check)
+
+
+def test_compare(data):
+    async def check(app, client, store):
+        a, b = store['eligible'][:2]
+        r = await client.get("/compare", params=[('player', a), ('player', b)])
+        assert r.status == 200
+        first, second = (await r.json())['players']
+        assert 'delta' not in first
+        for t in TARGETS:
+            assert second['delta'][t] == pytest.approx(second['predictions'][t] - first['predictions'][t])
+        assert (await client.get("/compare", params=[('player', a)])).status == 400
+
+    run(data, check)
+
+
+def test_bulk(data):
+    async def check(app, client, store):
+        everyone = (await (await client.post("/predict/bulk")).json())['players']
+        assert len(everyone) == len(store['eligible'])
+
+        team = next(iter(store['teams']))
+        r = await client.post("/predict/bulk", json={'teams': [team]})
+        on_team = {p['player'] for p in (await r.json())['players']}
+        assert on_team and on_team <= set(store['teams'][team])
+
+    run(data, check)
+
+
+def test_bad_bodies(data):
+    async def check(app, client, store):
+        for path in ("/predict/bulk", "/matches"):
+            r = await client.post(path, data="{not json", headers={'Content-Type': 'application/json'})
+            assert r.status == 400
+            assert (await client.post(path, json=["a list"])).status == 400
+        assert (await client.post("/predict/bulk", json={'players': "Player 000001"})).status == 400
+        assert (await client.post("/predict/bulk", json={'teams': "Arsenal"})).status == 400
+        assert (await client.post("/matches", json={'matches': "not rows"})).status == 400
+        assert (await client.post("/matches", json={'matches': [{'Player': "x"}]})).status == 400
+
+        # A null date or a non-numeric stat is rejected and leaves the player untouched
+        player = store['eligible'][0]
+        games = app['state'].games(player)
+        bad_rows = [{'Player': player, 'Date': None, 'xG': 0.5},
+                    {'Player': player, 'Date': "2030-01-01", 'xG': "abc"}]
+        for row in bad_rows:
+            for _ in range(2):
+                assert (await client.post("/matches", json={'matches': [row]})).status == 400
+        assert app['state'].games(player) == games
+        assert (await client.get(f"/players/{player}/prediction")).status == 200
+
+    run(data, check)
+
+
+def test_micro_batching(data):
+    async def check(app, client, store):
+        players = store['eligible'][:50]
+        responses = await asyncio.gather(*[client.get(f"/players/{p}/prediction") for p in players])
+        assert {r.status for r in responses} == {200}
+        batcher = app['batcher']
+        assert batcher.rows == len(players)
+        assert batcher.batches < len(players)
+
+    run(data, check, max_wait_ms=50.0)
+
+
+def test_post_matches(data):
+    async def check(app, client, store):
+        player = store['eligible'][0]
+        before = await (await client.get(f"/players/{player}/prediction")).json()
+        last = app['state'].last_date(player)
+        row = {'Player': player, 'Date': str((last + np.timedelta64(7, 'D')).date()),
+               **{m: 5.0 for m in FEATURE_METRICS}}
+
+        r = await client.post("/matches", json={'matches': [row]})
+        assert await r.json() == {'applied': 1, 'skipped': 0}
+        # Re-sending the same row is harmless
+        r = await client.post("/matches", json={'matches': [row]})
+        assert await r.json() == {'applied': 0, 'skipped': 1}
+
+        after = await (await client.get(f"/players/{player}/prediction")).json()
+        assert after['games'] == before['games'] + 1
+        assert after['last_match'] == row['Date']
+
+    run(data, check)
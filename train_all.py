@@ -1,56 +1,187 @@
-import pandas as pd
+import argparse
+import os
+import numpy as np
 import xgboost as xgb
-from sklearn.model_selection import train_test_split
+from concurrent.futures import ThreadPoolExecutor
 from sklearn.metrics import mean_absolute_error
-import joblib
+from features import FEATURE_COLS, FEATURE_METRICS, add_rolling_features
+from storage import read_matches
+from model_registry import data_fingerprint, save_bundle
+from scoring import INTERVAL_LABEL, QUANTILES, TARGETS, quantile_name
+from backtest import NUM_ROUNDS, PARAMS, date_split
+from tune import load_best_params
+from instrumentation import current_span, run_under, span
+from team_context import TEAM_CONTEXT_COLS, add_team_context, load_team_table
 
-def train_all_metrics():
+# The interval models: one multi-quantile booster per target with vector
+# leaves (every tree holds all the quantiles), so more quantiles don't mean
+# more trees to walk. Kept small: 30 depth-4 rounds match the pinball loss of
+# 200 rounds at the point models' settings, for ~15% of their trees.
+QUANTILE_PARAMS = {'objective': 'reg:quantileerror', 'tree_method': 'hist', 'quantile_alpha': list(QUANTILES),
+                   'multi_strategy': 'multi_output_tree', 'learning_rate': 0.3, 'max_depth': 4}
+QUANTILE_ROUNDS = 30
+
+
+def train_one(dtrain_base, X_train, y_train, feature_cols, nthread, params=PARAMS, num_rounds=NUM_ROUNDS,
+              target=None):
+    # One target's booster. The quantile cuts come from the shared base matrix,
+    # so only the label is new here.
+    with span("fit", target=target, rows=len(X_train), rounds=num_rounds, nthread=nthread):
+        dtrain = xgb.QuantileDMatrix(X_train, label=y_train, ref=dtrain_base, feature_names=feature_cols)
+        return xgb.train({**params, 'nthread': nthread}, dtrain, num_boost_round=num_rounds)
+
+
+def train_quantiles(dtrain_base, X_train, y_train, feature_cols, nthread, target=None):
+    with span("fit_quantiles", target=target, rows=len(X_train), quantiles=list(QUANTILES), nthread=nthread):
+        dtrain = xgb.QuantileDMatrix(X_train, label=y_train, ref=dtrain_base, feature_names=feature_cols)
+        return xgb.train({**QUANTILE_PARAMS, 'nthread': nthread}, dtrain, num_boost_round=QUANTILE_ROUNDS)
+
+
+def train_all_metrics(mode="parallel", workers=None, tuned=True, team_context=False, intervals=True):
     print("🧠 Loading Data for Multi-Target Training...")
-    df = pd.read_csv("training_data.csv")
-    df['Date'] = pd.to_datetime(df['Date'])
+    columns = ['Player', 'Date'] + FEATURE_METRICS
+    if team_context:
+        columns += ['Team', 'Match']
+    df = read_matches(columns=columns)
     df = df.sort_values(by=['Player', 'Date'])
-    
+
     # 1. Setup the Features (The Inputs)
     # We use the same rolling averages as before
-    feature_metrics = ['xG', 'xA', 'Passes', 'Dribbles', 'Minutes']
-    
+    feature_metrics = FEATURE_METRICS
+
     print("⚙️ Engineering Features...")
-    for m in feature_metrics:
-        df[f'Roll_3_{m}'] = df.groupby('Player')[m].transform(
-            lambda x: x.rolling(window=3, min_periods=1).mean().shift(1)
-        )
-    
-    df = df.dropna()
-    
+    df = add_rolling_features(df, feature_metrics, windows=(3,))
+    feature_cols = list(FEATURE_COLS)
+    stages = []
+    if team_context:
+        # Opt-in: opponent, home/away and both teams' rolling xG for/against
+        df = add_team_context(df, load_team_table())
+        feature_cols += TEAM_CONTEXT_COLS
+        stages.append('team_context')
+
+    # Players need some history; missing team context is left for XGBoost to handle
+    df = df.dropna(subset=FEATURE_COLS)
+
     # The list of things we want to predict
-    targets = ['xG', 'xA', 'Passes', 'Dribbles']
-    
-    print(f"📊 Training {len(targets)} separate models on {len(df)} rows...")
-    
+    targets = TARGETS
+
+    # 2. Build the feature matrix and split ONCE for every target
+    X = df[feature_cols].to_numpy(dtype=np.float32)
+    Y = df[targets].to_numpy(dtype=np.float32)
+
+    # Split by date: the latest ~20% of matchdays are held out, never half a matchday
+    train = date_split(df['Date'], test_size=0.2)
+    X_train, X_test = X[train], X[~train]
+    Y_train, Y_test = Y[train], Y[~train]
+
+    # Per-target settings from tune.py if there are any, otherwise the defaults
+    best = load_best_params(windows=(3,)) if tuned else None
+    settings = {}
     for target in targets:
-        print(f"\n🚀 Training Model for: {target.upper()}...")
-        
-        # Prepare inputs (X) and target (y)
-        feature_cols = [c for c in df.columns if 'Roll_' in c]
-        X = df[feature_cols]
-        y = df[target]
-        
-        # Split
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
-        
-        # Train
-        model = xgb.XGBRegressor(n_estimators=200, learning_rate=0.05, n_jobs=-1)
-        model.fit(X_train, y_train)
-        
-        # Evaluate
-        predictions = model.predict(X_test)
-        mae = mean_absolute_error(y_test, predictions)
+        if best and target in best:
+            settings[target] = (best[target]['params'], best[target]['num_boost_round'])
+        else:
+            settings[target] = (PARAMS, NUM_ROUNDS)
+    if best and mode == "parallel":
+        print(f"🎛️ Using tuned settings for {', '.join(t for t in targets if t in best)}")
+
+    cores = os.cpu_count() or 1
+    workers = min(workers or cores, len(targets))
+    nthread = max(1, cores // workers)
+    dtrain_base = None
+    if mode == "multi":
+        # One booster with a tree per target per round, all on one quantized matrix
+        # (one set of params for all targets, so the tuned ones don't apply)
+        settings = {target: (PARAMS, NUM_ROUNDS) for target in targets}
+        print(f"📊 Training 1 multi-output model for {len(targets)} targets on {len(df)} rows...")
+        with span("fit", target="multi", rows=len(X_train), rounds=NUM_ROUNDS, nthread=cores):
+            dtrain = xgb.QuantileDMatrix(X_train, label=Y_train, feature_names=feature_cols)
+            booster = xgb.train({**PARAMS, 'nthread': cores, 'multi_strategy': 'one_output_per_tree'},
+                                dtrain, num_boost_round=NUM_ROUNDS)
+        models, outputs = {'multi': booster}, {'multi': list(targets)}
+        with span("predict", target="multi", rows=len(X_test)):
+            predictions = booster.inplace_predict(X_test)
+    else:
+        # One booster per target, trained side by side. XGBoost releases the GIL,
+        # so a bounded thread pool splits the cores between targets.
+        print(f"📊 Training {len(targets)} separate models on {len(df)} rows "
+              f"({workers} at a time, {nthread} threads each)...")
+        dtrain_base = xgb.QuantileDMatrix(X_train, feature_names=feature_cols)
+        parent = current_span()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                target: pool.submit(run_under, parent, train_one, dtrain_base, X_train, Y_train[:, i], feature_cols,
+                                    nthread, *settings[target], target)
+                for i, target in enumerate(targets)
+            }
+            models = {target: f.result() for target, f in futures.items()}
+        outputs = {}
+        columns = []
+        for t in targets:
+            with span("predict", target=t, rows=len(X_test)):
+                columns.append(models[t].inplace_predict(X_test))
+        predictions = np.column_stack(columns)
+
+    # 3. Evaluate
+    metrics = {}
+    for i, target in enumerate(targets):
+        mae = mean_absolute_error(Y_test[:, i], predictions[:, i])
         print(f"   ✅ {target} MAE: {mae:.3f}")
-        
-        # Save
-        filename = f"model_{target}.pkl"
-        joblib.dump(model, filename)
-        print(f"   💾 Saved to {filename}")
+        metrics[target] = {'mae': float(mae)}
+
+    params = {
+        target: {**settings[target][0], 'num_boost_round': settings[target][1], 'mode': mode}
+        for target in targets
+    }
+
+    # 4. Prediction intervals: one multi-quantile model per target, same split
+    if intervals:
+        print(f"📏 Training {len(targets)} quantile models ({', '.join(map(str, QUANTILES))})...")
+        if dtrain_base is None:
+            dtrain_base = xgb.QuantileDMatrix(X_train, feature_names=feature_cols)
+        parent = current_span()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                target: pool.submit(run_under, parent, train_quantiles, dtrain_base, X_train, Y_train[:, i],
+                                    feature_cols, nthread, target)
+                for i, target in enumerate(targets)
+            }
+            for target, f in futures.items():
+                models[f"{target}_q"] = f.result()
+                outputs[f"{target}_q"] = [quantile_name(target, q) for q in QUANTILES]
+
+        for i, target in enumerate(targets):
+            with span("predict_quantiles", target=target, rows=len(X_test)):
+                bounds = np.asarray(models[f"{target}_q"].inplace_predict(X_test)).reshape(len(X_test), -1)
+            y = Y_test[:, i]
+            for j, q in enumerate(QUANTILES):
+                # Pinball loss: the quantile objective's own test error
+                err = y - bounds[:, j]
+                pinball = float(np.mean(np.maximum(q * err, (q - 1) * err)))
+                metrics[quantile_name(target, q)] = {'pinball': pinball}
+                params[quantile_name(target, q)] = {**QUANTILE_PARAMS, 'num_boost_round': QUANTILE_ROUNDS, 'mode': mode}
+            lo, hi = bounds.min(axis=1), bounds.max(axis=1)
+            coverage = float(np.mean((y >= lo) & (y <= hi)))
+            metrics[target]['interval_coverage'] = coverage
+            print(f"   📏 {target} {INTERVAL_LABEL} covers {coverage:.0%} of test matches")
+
+    # Save everything as one versioned bundle
+    with span("save_bundle"):
+        version = save_bundle(models, feature_cols, data_fingerprint(df), metrics, params, outputs=outputs,
+                              feature_stages=stages)
+    print(f"\n💾 Saved model bundle version {version}")
 
 if __name__ == "__main__":
-    train_all_metrics()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the xG/xA/Passes/Dribbles models")
+    parser.add_argument("--mode", choices=["parallel", "multi"], default="parallel",
+                        help="parallel: one model per target in a thread pool; multi: one multi-output model")
+    parser.add_argument("--workers", type=int, help="How many targets to train at once")
+    parser.add_argument("--no-tuned", action="store_true", help="Ignore tune.py's best settings")
+    parser.add_argument("--no-intervals", action="store_true", help="Skip the 10th/90th percentile models")
+    parser.add_argument("--team-context", action="store_true",
+                        help="Also train on opponent / home-away / team xG form (team_context.py)")
+    args = parser.parse_args()
+    # One outer span, so SOCCER_PROFILE=cprofile profiles the whole run
+    with span("train_all", mode=args.mode):
+        train_all_metrics(args.mode, args.workers, tuned=not args.no_tuned, team_context=args.team_context,
+                          intervals=not args.no_intervals)
@@ -2,32 +2,25 @@ import pandas as pd
 import numpy as np
 import xgboost as xgb
 from sklearn.metrics import mean_absolute_error
-from sklearn.model_selection import train_test_split
-import joblib  # To save the model file
+from features import FEATURE_METRICS, add_rolling_features
+from storage import read_matches
+from backtest import date_split
+from model_registry import data_fingerprint, save_bundle
 
 def train_predictor():
     print("🧠 Loading Training Data...")
-    df = pd.read_csv("training_data.csv")
+    df = read_matches(columns=['Player', 'Date'] + FEATURE_METRICS)
     
     # Ensure date is sorted so we don't cheat (train on future data)
-    df['Date'] = pd.to_datetime(df['Date'])
     df = df.sort_values(by=['Player', 'Date'])
 
     print("⚙️ Feature Engineering (Teaching the AI about 'Form')...")
     
     # 1. Create Lag Features (Moving Averages)
     # We want the model to know: "How did this player do in their LAST 3 games?"
-    metrics = ['xG', 'xA', 'Passes', 'Dribbles', 'Minutes']
-    
-    for metric in metrics:
-        # Calculate average of last 3 games
-        df[f'Roll_3_{metric}'] = df.groupby('Player')[metric].transform(
-            lambda x: x.rolling(window=3, min_periods=1).mean().shift(1)
-        )
-        # Calculate average of last 10 games (Long term form)
-        df[f'Roll_10_{metric}'] = df.groupby('Player')[metric].transform(
-            lambda x: x.rolling(window=10, min_periods=1).mean().shift(1)
-        )
+    # Average of the last 3 games (short term) and last 10 games (long term form)
+    metrics = FEATURE_METRICS
+    df = add_rolling_features(df, metrics, windows=(3, 10))
 
     # 2. Define the TARGET (What we want to predict)
     # We want to predict the ACTUAL xG of the CURRENT match
@@ -46,8 +39,9 @@ def train_predictor():
     X = df[feature_cols]
     y = df[target_col]
 
-    # Split: 80% for learning, 20% for testing
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, shuffle=False)
+    # Split by date: first ~80% of matchdays for learning, the rest for testing
+    train = date_split(df['Date'], test_size=0.2)
+    X_train, X_test, y_train, y_test = X[train], X[~train], y[train], y[~train]
 
     # 4. Train the Model (XGBoost)
     print("🚀 Training XGBoost Model...")
@@ -67,9 +61,10 @@ def train_predictor():
     print(f"   Mean Absolute Error: {mae:.3f}")
     print("   (This means on average, the prediction is off by only this much xG)")
 
-    # 6. Save the Model
-    joblib.dump(model, "xg_model.pkl")
-    print("💾 Model saved to 'xg_model.pkl'")
+    # 6. Save the Model (its own bundle, so it never gets mixed up with the dashboard models)
+    version = save_bundle({target_col: model}, feature_cols, data_fingerprint(df),
+                          {target_col: {'mae': float(mae)}}, name="xg_long_form")
+    print(f"💾 Model saved to bundle 'xg_long_form' version {version}")
     
     # 7. Show a Prediction Example
     print("\n🔮 Sample Prediction vs Reality (Test Set):")
@@ -0,0 +1,191 @@
+import argparse
+import hashlib
+import json
+import os
+import numpy as np
+import xgboost as xgb
+from concurrent.futures import ProcessPoolExecutor
+from features import FEATURE_METRICS, feature_columns
+from storage import data_version
+from scoring import TARGETS
+from backtest import date_split, load_feature_table
+
+# Hyperparameter search for the per-target models:
+#   random candidates -> successive halving on the number of boosting rounds,
+#   early stopping on a date-ordered validation split, one thread per trial.
+# Every finished trial is appended to a JSONL log, so a killed run picks up
+# where it stopped, and the winners land in BEST_FILE for train_all.py.
+TUNING_DIR = "tuning"
+LOG_FILE = "trials.jsonl"
+BEST_FILE = "best_params.json"
+
+BASE_PARAMS = {'objective': 'reg:squarederror', 'tree_method': 'hist', 'eval_metric': 'mae'}
+EARLY_STOPPING_ROUNDS = 25
+
+# name -> (kind, low, high). 'log' samples uniformly in log space.
+SEARCH_SPACE = {
+    'learning_rate': ('log', 0.01, 0.3),
+    'max_depth': ('int', 2, 8),
+    'min_child_weight': ('log', 1.0, 50.0),
+    'subsample': ('float', 0.5, 1.0),
+    'colsample_bytree': ('float', 0.5, 1.0),
+    'reg_lambda': ('log', 0.1, 20.0),
+}
+
+
+def sample_params(rng):
+    params = {}
+    for name, (kind, low, high) in SEARCH_SPACE.items():
+        if kind == 'int':
+            params[name] = int(rng.integers(low, high + 1))
+        elif kind == 'log':
+            params[name] = round(float(np.exp(rng.uniform(np.log(low), np.log(high)))), 5)
+        else:
+            params[name] = round(float(rng.uniform(low, high)), 4)
+    return params
+
+
+def trial_key(target, params, rounds, version):
+    payload = json.dumps([target, params, rounds, version], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def load_trials(path):
+    # {key: record} of every trial already finished (a torn last line is ignored)
+    trials = {}
+    if not os.path.exists(path):
+        return trials
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            trials[record['key']] = record
+    return trials
+
+
+def load_best_params(windows=(3,), root=TUNING_DIR):
+    # {target: {'params': {...}, 'num_boost_round': int, ...}} or None if never tuned
+    path = os.path.join(root, _tag(windows), BEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _tag(windows):
+    return "w" + "-".join(map(str, windows))
+
+
+# Worker state, set once per process instead of pickling the data per trial
+_X_fit = _Y_fit = _X_val = _Y_val = None
+
+
+def _init_worker(X_fit, Y_fit, X_val, Y_val):
+    global _X_fit, _Y_fit, _X_val, _Y_val
+    _X_fit, _Y_fit, _X_val, _Y_val = X_fit, Y_fit, X_val, Y_val
+
+
+def run_trial(target_index, params, rounds):
+    dfit = xgb.DMatrix(_X_fit, label=_Y_fit[:, target_index], nthread=1)
+    dval = xgb.DMatrix(_X_val, label=_Y_val[:, target_index], nthread=1)
+    booster = xgb.train({**BASE_PARAMS, **params, 'nthread': 1}, dfit, num_boost_round=rounds,
+                        evals=[(dval, 'val')], early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+                        verbose_eval=False)
+    return {'val_mae': float(booster.best_score), 'best_rounds': int(booster.best_iteration) + 1}
+
+
+def tune(n_trials=24, min_rounds=50, max_rounds=800, eta=3, windows=(3,), targets=TARGETS,
+         workers=None, seed=0, root=TUNING_DIR):
+    # 1. Same rows train_all.py trains on: drop its held-out test dates, then
+    #    validate on the latest matchdays of what's left
+    df = load_feature_table(windows)
+    df = df[date_split(df['Date'], test_size=0.2)]
+    fit = date_split(df['Date'], test_size=0.2)
+    cols = feature_columns(FEATURE_METRICS, windows)
+    X = df[cols].to_numpy(dtype=np.float32)
+    Y = df[TARGETS].to_numpy(dtype=np.float32)
+
+    out_dir = os.path.join(root, _tag(windows))
+    os.makedirs(out_dir, exist_ok=True)
+    log_path = os.path.join(out_dir, LOG_FILE)
+    trials = load_trials(log_path)
+    version = data_version()
+
+    # 2. Fixed seed, so a resumed run regenerates the same candidates
+    rng = np.random.default_rng(seed)
+    candidates = [sample_params(rng) for _ in range(n_trials)]
+    alive = {target: list(range(n_trials)) for target in targets}
+
+    # Rung budgets: min_rounds, min_rounds*eta, ... capped at max_rounds
+    budgets = []
+    rounds = min_rounds
+    while rounds < max_rounds:
+        budgets.append(rounds)
+        rounds *= eta
+    budgets.append(max_rounds)
+
+    print(f"🎛️ Tuning {len(targets)} targets: {n_trials} candidates, rungs {budgets} "
+          f"({len(trials)} trials already logged)")
+    workers = workers or os.cpu_count() or 1
+    best = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(X[fit], Y[fit], X[~fit], Y[~fit])) as pool, open(log_path, "a") as log:
+        for rung, rounds in enumerate(budgets):
+            # 3. Every surviving candidate of every target at this budget, in one pool
+            scores, futures = {}, {}
+            for target in targets:
+                for c in alive[target]:
+                    key = trial_key(target, candidates[c], rounds, version)
+                    if key in trials:
+                        scores[(target, c)] = trials[key]
+                    else:
+                        futures[(target, c, key)] = pool.submit(run_trial, TARGETS.index(target), candidates[c], rounds)
+
+            for (target, c, key), future in futures.items():
+                record = {'key': key, 'target': target, 'rung': rung, 'rounds': rounds,
+                          'params': candidates[c], 'data_version': version, **future.result()}
+                log.write(json.dumps(record) + "\n")
+                log.flush()
+                trials[key] = record
+                scores[(target, c)] = record
+            print(f"   Rung {rung} ({rounds} rounds): {len(futures)} new trials, {len(scores) - len(futures)} from the log")
+
+            # 4. Keep the best 1/eta of each target for the next rung
+            for target in targets:
+                ranked = sorted(alive[target], key=lambda c: scores[(target, c)]['val_mae'])
+                alive[target] = ranked[:max(1, len(ranked) // eta)]
+                winner = scores[(target, ranked[0])]
+                best[target] = {
+                    'params': {**BASE_PARAMS, **winner['params']},
+                    'num_boost_round': winner['best_rounds'],
+                    'val_mae': winner['val_mae'],
+                    'data_version': version,
+                }
+
+    # Targets not tuned in this run keep their earlier winners
+    merged = {**(load_best_params(windows, root) or {}), **best}
+    with open(os.path.join(out_dir, BEST_FILE), "w") as f:
+        json.dump(merged, f, indent=2)
+    print("\n✅ Best settings:")
+    for target, b in best.items():
+        print(f"   {target}: val MAE {b['val_mae']:.3f} with {b['num_boost_round']} rounds, {b['params']}")
+    print(f"💾 Saved to '{os.path.join(out_dir, BEST_FILE)}' (train_all.py picks them up)")
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune the XGBoost settings of each target model")
+    parser.add_argument("--trials", type=int, default=24, help="Random candidates per target")
+    parser.add_argument("--min-rounds", type=int, default=50, help="Boosting rounds on the first rung")
+    parser.add_argument("--max-rounds", type=int, default=800, help="Boosting rounds on the last rung")
+    parser.add_argument("--eta", type=int, default=3, help="Keep 1/eta of the candidates per rung")
+    parser.add_argument("--window", type=int, action="append", dest="windows", help="Rolling window, repeatable")
+    parser.add_argument("--target", action="append", dest="targets", choices=TARGETS, help="Only tune these")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tune(args.trials, args.min_rounds, args.max_rounds, args.eta, tuple(args.windows or (3,)),
+         args.targets or TARGETS, args.workers, args.seed)